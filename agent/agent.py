@@ -1,11 +1,12 @@
 import socket
 import platform
 import subprocess
-import requests
 import hashlib
 import re
 from datetime import datetime, timezone
 
+from transport import Transport
+
 BACKEND_URL = "http://127.0.0.1:8000/agent/heartbeat"
 
 def get_ip():
@@ -60,5 +61,5 @@ def collect(username):
 if __name__ == "__main__":
     user = input("Enter username: ").strip()
     payload = collect(user)
-    res = requests.post(BACKEND_URL, json=payload)
+    res = Transport().post(BACKEND_URL, json=payload)
     print(res.text)
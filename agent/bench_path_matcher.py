@@ -0,0 +1,68 @@
+"""
+Benchmark path_matcher.PathMatcher against the substring scan
+monitor_file_access used to do: any(pattern in path.lower() ...).
+Generates N paths and M patterns, checks both agree on plain substring
+patterns and times them, then times a mixed substring/dir/glob rule set.
+
+Usage: python bench_path_matcher.py [paths] [patterns]
+"""
+
+import random
+import re
+import string
+import sys
+import time
+
+from path_matcher import PathMatcher
+
+def random_word(rng, low=3, high=10):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(low, high)))
+
+def random_paths(rng, count, vocabulary):
+    roots = ["/home/alice", "/home/bob", "C:\\Users\\carol", "/var/lib", "/opt/app"]
+    paths = []
+    for _ in range(count):
+        parts = [rng.choice(vocabulary) if rng.random() < 0.05 else random_word(rng) for _ in range(rng.randint(2, 6))]
+        name = random_word(rng) + rng.choice([".txt", ".docx", ".pem", ".py", ".csv", ".log"])
+        sep = "\\" if rng.random() < 0.2 else "/"
+        paths.append(rng.choice(roots) + sep + sep.join(parts + [name]))
+    return paths
+
+def timed(label, func, paths):
+    started = time.perf_counter()
+    hits = sum(1 for path in paths if func(path))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:.3f}s  {hits} matches")
+    return elapsed
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    pattern_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = random.Random(42)
+
+    substrings = sorted({random_word(rng, 4, 12) for _ in range(pattern_count * 2)})[:pattern_count]
+    paths = random_paths(rng, count, substrings)
+    print(f"{count} paths, {len(substrings)} patterns")
+
+    def substring_scan(path):
+        file_path = path.lower()
+        return any(sensitive in file_path for sensitive in substrings)
+
+    alternation = re.compile("|".join(map(re.escape, substrings)), re.IGNORECASE).search
+    matcher = PathMatcher(substrings)
+
+    assert [substring_scan(p) for p in paths] == [matcher(p) for p in paths], "PathMatcher disagrees with the substring scan"
+
+    baseline = timed("any() substring scan", substring_scan, paths)
+    timed("regex alternation, IGNORECASE", alternation, paths)
+    compiled = timed("PathMatcher (trie regex)", matcher, paths)
+    print(f"Speedup over substring scan: {baseline / compiled:.1f}x")
+
+    # A realistic mix: mostly substrings plus component and glob rules
+    mixed = (substrings[:pattern_count * 8 // 10]
+             + [f"dir:{word}" for word in substrings[-pattern_count // 10:]]
+             + [f"glob:*{word[:4]}*.pem" for word in substrings[:pattern_count // 10]])
+    timed(f"PathMatcher, {len(mixed)} mixed rules", PathMatcher(mixed), paths)
+
+if __name__ == "__main__":
+    main()
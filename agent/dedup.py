@@ -0,0 +1,71 @@
+"""
+Bounded, time-expiring duplicate suppression for agent events.
+
+Keys are reduced to a 64-bit hash, so memory per entry does not depend
+on path length. An entry suppresses repeats for DEDUP_WINDOW seconds
+from its first sighting. Entries sit in first-seen order, which is also
+expiry order, so expired ones are dropped from the front in O(1). When
+DEDUP_MAX_ENTRIES is reached the oldest entry is evicted early, so
+memory stays bounded however long the agent runs.
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW", "3600"))
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "50000"))
+
+def key_hash(*parts):
+    digest = hashlib.blake2b("\0".join(map(str, parts)).encode("utf-8", "surrogatepass"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+class DedupCache:
+    def __init__(self, window=DEDUP_WINDOW, max_entries=DEDUP_MAX_ENTRIES):
+        self.window = window
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.checked = 0
+        self.suppressed = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _expire(self, now):
+        entries = self._entries
+        while entries:
+            key, expires = next(iter(entries.items()))
+            if expires > now:
+                break
+            del entries[key]
+            self.expired += 1
+
+    def seen(self, *parts, now=None):
+        """True if `parts` was already seen within the window, otherwise remember it and return False"""
+        now = time.time() if now is None else now
+        self._expire(now)
+        self.checked += 1
+        key = key_hash(*parts)
+        if key in self._entries:
+            self.suppressed += 1
+            return True
+        if len(self._entries) >= self.max_entries:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+        self._entries[key] = now + self.window
+        return False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "window": self.window,
+            "checked": self.checked,
+            "suppressed": self.suppressed,
+            "suppression_rate": round(self.suppressed / self.checked, 4) if self.checked else 0.0,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,271 @@
+"""
+File access event sources for the agent.
+
+A watcher streams open/write/create/delete events for a set of root
+directories into a bounded queue, and the scan loop drains it once per
+cycle. Backends, picked by create_watcher():
+
+- inotify (Linux): kernel events through ctypes, no extra dependencies.
+  CPU cost follows the number of events, not the number of processes,
+  and files opened and closed between two cycles are still seen.
+- watchdog (Windows/macOS, optional package): same event model through
+  the platform's native API. Open events are only reported on Linux.
+- polling: the original psutil open_files scan, run on each drain(),
+  for when neither of the above is available.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+# auto, inotify, watchdog or polling
+FILE_WATCH_BACKEND = os.getenv("FILE_WATCH_BACKEND", "auto")
+# Events kept between two drains, older ones are dropped first
+FILE_EVENT_QUEUE = int(os.getenv("FILE_EVENT_QUEUE", "10000"))
+# Upper bound on watched directories, each inotify watch costs kernel memory
+FILE_WATCH_MAX_DIRS = int(os.getenv("FILE_WATCH_MAX_DIRS", "8192"))
+
+FileEvent = namedtuple("FileEvent", "path action time process")
+
+class _Watcher:
+    backend = None
+
+    def __init__(self, roots):
+        self.roots = [os.path.abspath(os.path.expanduser(str(root))) for root in roots]
+        self._events = deque(maxlen=FILE_EVENT_QUEUE)
+        self.received = 0
+        self.dropped = 0
+
+    def _emit(self, path, action, process=None):
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(FileEvent(path, action, time.time(), process))
+        self.received += 1
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def drain(self):
+        """Events since the last drain, oldest first"""
+        events = []
+        while self._events:
+            events.append(self._events.popleft())
+        return events
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "roots": len(self.roots),
+            "received": self.received,
+            "dropped": self.dropped,
+            "pending": len(self._events),
+        }
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_OPEN = 0x00000020
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+
+INOTIFY_MASK = (IN_OPEN | IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM |
+                IN_MOVED_TO | IN_DELETE_SELF)
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Checked in order, the first matching bit names the action
+INOTIFY_ACTIONS = (
+    (IN_DELETE | IN_MOVED_FROM, "DELETE"),
+    (IN_CREATE | IN_MOVED_TO, "CREATE"),
+    (IN_CLOSE_WRITE, "WRITE"),
+    (IN_OPEN, "READ"),
+)
+
+class InotifyWatcher(_Watcher):
+    """Recursive watches on every directory under the roots, new directories are picked up as they appear"""
+    backend = "inotify"
+
+    def __init__(self, roots):
+        super().__init__(roots)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = None
+        self._paths = {}
+        self._thread = None
+        self._stopping = threading.Event()
+        self.watch_errors = 0
+        self.overflows = 0
+
+    def start(self):
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._fd = fd
+        for root in self.roots:
+            self._watch_tree(root)
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="inotify-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._paths.clear()
+
+    def _watch(self, path):
+        if len(self._paths) >= FILE_WATCH_MAX_DIRS:
+            self.watch_errors += 1
+            return
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), INOTIFY_MASK)
+        if wd < 0:
+            # ENOSPC once fs.inotify.max_user_watches is reached, EACCES on private directories
+            self.watch_errors += 1
+            return
+        self._paths[wd] = path
+
+    def _watch_tree(self, root):
+        for directory, _, _ in os.walk(root):
+            self._watch(directory)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                ready, _, _ = select.select([self._fd], [], [], 1.0)
+                if ready:
+                    self._read(os.read(self._fd, 65536))
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                if self._stopping.is_set():
+                    break
+                print(f"[ERROR] inotify read failed: {e}")
+                time.sleep(1)
+
+    def _read(self, data):
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].split(b"\0", 1)[0]
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self.overflows += 1
+                continue
+            if mask & IN_IGNORED:
+                self._paths.pop(wd, None)
+                continue
+            directory = self._paths.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(path)
+                continue
+            for bits, action in INOTIFY_ACTIONS:
+                if mask & bits:
+                    self._emit(path, action)
+                    break
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(watched_dirs=len(self._paths), watch_errors=self.watch_errors, overflows=self.overflows)
+        return stats
+
+class WatchdogWatcher(_Watcher):
+    backend = "watchdog"
+
+    WATCHDOG_ACTIONS = {
+        "opened": "READ",
+        "closed": "WRITE",
+        "modified": "WRITE",
+        "created": "CREATE",
+        "deleted": "DELETE",
+    }
+
+    def __init__(self, roots):
+        super().__init__(roots)
+        from watchdog.observers import Observer
+        self._observer = Observer()
+
+    def start(self):
+        from watchdog.events import FileSystemEventHandler
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                if event.event_type == "moved":
+                    watcher._emit(event.src_path, "DELETE")
+                    watcher._emit(event.dest_path, "CREATE")
+                elif event.event_type in watcher.WATCHDOG_ACTIONS:
+                    watcher._emit(event.src_path, watcher.WATCHDOG_ACTIONS[event.event_type])
+
+        handler = Handler()
+        for root in self.roots:
+            self._observer.schedule(handler, root, recursive=True)
+        self._observer.start()
+
+    def stop(self):
+        self._observer.stop()
+        self._observer.join(timeout=5)
+
+class PollingWatcher(_Watcher):
+    """Files currently held open by any process, sampled on each drain()"""
+    backend = "polling"
+
+    def drain(self):
+        import psutil
+
+        for proc in psutil.process_iter(['name', 'open_files']):
+            try:
+                for file in proc.info['open_files'] or ():
+                    self._emit(file.path, "READ", proc.info['name'])
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return super().drain()
+
+def create_watcher(roots, backend=FILE_WATCH_BACKEND):
+    """Start the best available watcher for `roots`, falling back to polling"""
+    roots = [root for root in roots if os.path.isdir(os.path.expanduser(str(root)))]
+    candidates = {
+        "auto": ["inotify", "watchdog"] if sys.platform.startswith("linux") else ["watchdog"],
+        "inotify": ["inotify"],
+        "watchdog": ["watchdog"],
+        "polling": [],
+    }.get(backend, [])
+    backends = {"inotify": InotifyWatcher, "watchdog": WatchdogWatcher}
+
+    if roots:
+        for name in candidates:
+            try:
+                watcher = backends[name](roots)
+                watcher.start()
+                return watcher
+            except (ImportError, OSError, AttributeError) as e:
+                print(f"[WARN] {name} file watcher unavailable: {e}")
+
+    watcher = PollingWatcher(roots)
+    watcher.start()
+    return watcher
@@ -29,6 +29,12 @@ echo.
 REM Download agent files from GitHub
 echo [INFO] Downloading agent files...
 curl -L -o "%INSTALL_DIR%\zero_trust_agent.py" https://raw.githubusercontent.com/BHARGAVSAI558/zero-trust-tool/main/agent/zero_trust_agent.py
+curl -L -o "%INSTALL_DIR%\ip_classifier.py" https://raw.githubusercontent.com/BHARGAVSAI558/zero-trust-tool/main/agent/ip_classifier.py
+curl -L -o "%INSTALL_DIR%\file_events.py" https://raw.githubusercontent.com/BHARGAVSAI558/zero-trust-tool/main/agent/file_events.py
+curl -L -o "%INSTALL_DIR%\path_matcher.py" https://raw.githubusercontent.com/BHARGAVSAI558/zero-trust-tool/main/agent/path_matcher.py
+curl -L -o "%INSTALL_DIR%\dedup.py" https://raw.githubusercontent.com/BHARGAVSAI558/zero-trust-tool/main/agent/dedup.py
+curl -L -o "%INSTALL_DIR%\transport.py" https://raw.githubusercontent.com/BHARGAVSAI558/zero-trust-tool/main/agent/transport.py
+curl -L -o "%INSTALL_DIR%\spool.py" https://raw.githubusercontent.com/BHARGAVSAI558/zero-trust-tool/main/agent/spool.py
 curl -L -o "%INSTALL_DIR%\requirements.txt" https://raw.githubusercontent.com/BHARGAVSAI558/zero-trust-tool/main/agent/requirements.txt
 
 if not exist "%INSTALL_DIR%\zero_trust_agent.py" (
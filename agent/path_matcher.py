@@ -0,0 +1,113 @@
+"""
+Sensitive path matching compiled into one regex.
+
+Patterns are compiled once and every path is tested with a single
+case-insensitive regex search, instead of a substring scan per pattern:
+
+- "payroll"           substring anywhere in the path (the SENSITIVE_PATHS meaning)
+- "dir:hr"            a whole path component, matches .../hr/... but not .../chrome/...
+- "glob:*.pem"        glob on the file name, or on the path tail if the glob has a
+                      separator ("glob:.ssh/id_*"); "*" stays within a component,
+                      "**" crosses separators
+
+Plain substrings are merged into a prefix trie before being turned into a
+regex, so patterns sharing a prefix are tried together rather than one
+alternative at a time, close to what an Aho-Corasick automaton gives.
+"""
+
+import re
+
+_SEP = r"[/\\]"
+_NOT_SEP = r"[^/\\]"
+
+def _trie_regex(words):
+    """Regex matching any of `words`, with common prefixes factored out"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        end = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not end:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if end else body
+
+    return build(trie)
+
+def _glob_regex(glob):
+    out = []
+    i = 0
+    while i < len(glob):
+        char = glob[i]
+        if glob.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            out.append(_NOT_SEP + "*")
+        elif char == "?":
+            out.append(_NOT_SEP)
+        elif char == "[":
+            end = glob.find("]", i + 2)
+            if end == -1:
+                out.append(re.escape(char))
+            else:
+                body = glob[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        elif char in "/\\":
+            out.append(_SEP)
+        else:
+            out.append(re.escape(char))
+        i += 1
+    return "".join(out) + "$"
+
+def _is_absolute(glob):
+    return glob[:1] in "/\\" or re.match(r"[a-z]:", glob) is not None
+
+class PathMatcher:
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        substrings, components, tails, absolute = [], [], [], []
+        # Matching is done on the lowercased path, which is much faster than re.IGNORECASE
+        for pattern in self.patterns:
+            pattern = pattern.lower()
+            kind, _, value = pattern.partition(":")
+            if kind == "dir" and value:
+                components.append(value)
+            elif kind == "glob" and value:
+                (absolute if _is_absolute(value) else tails).append(_glob_regex(value))
+            elif pattern:
+                substrings.append(pattern)
+
+        alternatives = []
+        if substrings:
+            alternatives.append(_trie_regex(substrings))
+        # Component and tail rules start at a component boundary, grouped behind
+        # one boundary check so most positions are rejected by a single test
+        anchored = []
+        if components:
+            anchored.append(_trie_regex(components) + "(?:" + _SEP + "|$)")
+        anchored.extend(tails)
+        if anchored:
+            alternatives.append("(?:^|(?<=" + _SEP + "))(?:" + "|".join(anchored) + ")")
+        alternatives.extend("^" + regex for regex in absolute)
+        self.regex = re.compile("|".join(alternatives)) if alternatives else None
+
+    def matches(self, path):
+        return self.regex is not None and self.regex.search(path.lower()) is not None
+
+    __call__ = matches
+
+    def filter(self, paths):
+        """The paths that match, in order"""
+        return [path for path in paths if self.matches(path)]
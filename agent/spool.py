@@ -0,0 +1,261 @@
+"""
+Durable on-disk spool for agent telemetry.
+
+Every event is appended to a SQLite database in WAL mode before anything
+is sent, so telemetry survives backend outages and agent restarts. A
+background SpoolUploader drains it in id order, SPOOL_BATCH events per
+request, and deletes a batch only once the backend has accepted it, so
+events arrive in the order they were recorded. Events the backend refuses
+outright (an "Invalid batch" error or a 4xx other than 408/429) are
+dropped one by one rather than retried forever. The scan loop only ever
+does a local insert and never waits on the network.
+
+Disk use is capped at SPOOL_MAX_BYTES of event data: when an append
+goes over it, the oldest events are evicted first.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+SPOOL_PATH = os.getenv("SPOOL_PATH", str(Path.home() / ".zerotrust" / "spool.db"))
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", str(50 * 1024 * 1024)))
+# Events per upload, at most the backend's TELEMETRY_MAX_EVENTS
+SPOOL_BATCH = int(os.getenv("SPOOL_BATCH", "500"))
+# Seconds between upload attempts while there is a backlog or the backend is down
+SPOOL_INTERVAL = float(os.getenv("SPOOL_INTERVAL", "15"))
+# Upper bound on the last upload attempt when the agent shuts down
+SPOOL_DRAIN_TIMEOUT = float(os.getenv("SPOOL_DRAIN_TIMEOUT", "10"))
+
+class Spool:
+    def __init__(self, path=SPOOL_PATH, max_bytes=SPOOL_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by the scan loop and the uploader thread
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                body TEXT NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        row = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM events").fetchone()
+        self.pending, self.bytes = row
+        self.appended = 0
+        self.acked = 0
+        self.evicted = 0
+
+    def append(self, events):
+        """Persist events (JSON-serialisable dicts) in one transaction"""
+        rows = [(body, len(body)) for body in map(json.dumps, events)]
+        if not rows:
+            return 0
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany("INSERT INTO events (body, size) VALUES (?, ?)", rows)
+                self.pending += len(rows)
+                self.bytes += sum(size for _, size in rows)
+                if self.bytes > self.max_bytes:
+                    self._evict(self.bytes - self.max_bytes)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                row = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM events").fetchone()
+                self.pending, self.bytes = row
+                raise
+        self.appended += len(rows)
+        return len(rows)
+
+    def _evict(self, excess):
+        freed, count, last_id = 0, 0, None
+        for event_id, size in self._db.execute("SELECT id, size FROM events ORDER BY id"):
+            freed += size
+            count += 1
+            last_id = event_id
+            if freed >= excess:
+                break
+        if last_id is not None:
+            self._db.execute("DELETE FROM events WHERE id <= ?", (last_id,))
+            self.pending -= count
+            self.bytes -= freed
+            self.evicted += count
+
+    def peek(self, limit=SPOOL_BATCH):
+        """Oldest `limit` events as [(id, body)]"""
+        with self._lock:
+            return self._db.execute("SELECT id, body FROM events ORDER BY id LIMIT ?", (limit,)).fetchall()
+
+    def ack(self, last_id):
+        """Delete every event up to and including `last_id`"""
+        with self._lock:
+            count, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM events WHERE id <= ?", (last_id,)
+            ).fetchone()
+            self._db.execute("DELETE FROM events WHERE id <= ?", (last_id,))
+            self.pending -= count
+            self.bytes -= size
+            self.acked += count
+
+    def stats(self):
+        return {
+            "pending": self.pending,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "appended": self.appended,
+            "acked": self.acked,
+            "evicted": self.evicted,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Outcomes of one upload request
+SENT, RETRY, REJECTED = "sent", "retry", "rejected"
+# Client errors that are worth retrying, every other 4xx means the batch itself is refused
+RETRY_CLIENT_ERRORS = frozenset({408, 429})
+
+class SpoolUploader:
+    """Drains a Spool to the backend's NDJSON batch endpoint from a background thread"""
+
+    def __init__(self, spool, transport, path="/files/access/batch", batch=SPOOL_BATCH, interval=SPOOL_INTERVAL):
+        self.spool = spool
+        self.transport = transport
+        self.path = path
+        self.batch = batch
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        # One upload at a time, so no batch is ever sent twice concurrently
+        self._upload_lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.failures = 0
+        self.rejected = 0
+        self.last_error = None
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="spool-uploader", daemon=True)
+        self._thread.start()
+
+    def stop(self, drain=True, drain_timeout=SPOOL_DRAIN_TIMEOUT):
+        """Stop the thread, making one last attempt of at most `drain_timeout` seconds to empty the spool"""
+        deadline = time.monotonic() + drain_timeout
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=drain_timeout)
+            self._thread = None
+        if drain:
+            self.upload(deadline)
+
+    def wake(self):
+        """Upload now instead of at the next interval, e.g. after an append"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.upload()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def upload(self, deadline=None):
+        """
+        Send batches oldest first until the spool is empty, a batch fails or
+        the monotonic `deadline` passes, returns events removed
+        """
+        sent = 0
+        # The uploader thread may still be mid-request when stop() gives up on it
+        if not self._upload_lock.acquire(timeout=-1 if deadline is None else max(self._remaining(deadline), 0)):
+            return sent
+        try:
+            while self._remaining(deadline) > 0:
+                rows = self.spool.peek(self.batch)
+                if not rows:
+                    break
+                result = self._send(rows, deadline)
+                if result == REJECTED and len(rows) > 1:
+                    # Find the offending events one by one, keeping the rest
+                    for row in rows:
+                        if self._remaining(deadline) <= 0:
+                            result = RETRY
+                            break
+                        result = self._send([row], deadline)
+                        if result == RETRY:
+                            break
+                        if result == REJECTED:
+                            self._reject([row])
+                        self.spool.ack(row[0])
+                        sent += 1
+                    if result == RETRY:
+                        break
+                    continue
+                if result == RETRY:
+                    break
+                if result == REJECTED:
+                    self._reject(rows)
+                self.spool.ack(rows[-1][0])
+                sent += len(rows)
+        finally:
+            self._upload_lock.release()
+        return sent
+
+    @staticmethod
+    def _remaining(deadline):
+        return float("inf") if deadline is None else deadline - time.monotonic()
+
+    def _reject(self, rows):
+        # The backend will never accept these, drop them rather than block everything behind them
+        print(f"[WARN] Dropping {len(rows)} spooled events rejected by the backend: {self.last_error}")
+        self.rejected += len(rows)
+
+    def _send(self, rows, deadline=None):
+        try:
+            response = self.transport.post(
+                self.path,
+                data="\n".join(body for _, body in rows),
+                headers={"Content-Type": "application/x-ndjson"},
+                timeout=min(30, max(self._remaining(deadline), 1)),
+                # No backoff sleeps when shutting down against a deadline
+                retries=None if deadline is None else 0
+            )
+            result = response.json() if response.status_code == 200 else {}
+        except Exception as e:
+            # Offline or breaker open: keep the batch and retry next interval
+            self.failures += 1
+            self.last_error = str(e)
+            return RETRY
+
+        if result.get("status") == "SUCCESS":
+            self.batches += 1
+            self.last_error = None
+            return SENT
+        error = str(result.get("error", response.status_code))
+        self.last_error = error
+        # e.g. 400 from the gzip middleware or 413, resending the same bytes cannot succeed
+        if error.startswith("Invalid batch") or (
+                400 <= response.status_code < 500 and response.status_code not in RETRY_CLIENT_ERRORS):
+            return REJECTED
+        self.failures += 1
+        return RETRY
+
+    def stats(self):
+        stats = self.spool.stats()
+        stats.update(
+            uploaded=stats["acked"] - self.rejected,
+            batches=self.batches,
+            failures=self.failures,
+            rejected=self.rejected,
+            last_error=self.last_error,
+        )
+        return stats
@@ -0,0 +1,180 @@
+"""
+Shared HTTP transport for the agents.
+
+One pooled requests.Session per backend, so every call after the first
+reuses a kept-alive TCP+TLS connection instead of doing a fresh
+handshake. On top of it:
+
+- request bodies of TRANSPORT_GZIP_MIN bytes or more are gzip-compressed
+  (the backend inflates Content-Encoding: gzip on every endpoint)
+- connection errors, timeouts, 429 and 502-504 are retried with jittered
+  exponential backoff
+- a circuit breaker: after BREAKER_FAILURES failed calls in a row, calls
+  fail fast with CircuitOpenError for BREAKER_COOLDOWN seconds, then a
+  single trial call decides whether to close it again. Agents use this as
+  their offline mode instead of waiting out timeouts every cycle.
+
+Retried POSTs can be delivered twice if a response is lost after the
+backend committed; the endpoints the agents call are upserts or
+append-only logs, where that is harmless.
+"""
+
+import gzip
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+TRANSPORT_RETRIES = int(os.getenv("TRANSPORT_RETRIES", "3"))
+TRANSPORT_BACKOFF = float(os.getenv("TRANSPORT_BACKOFF", "0.5"))
+TRANSPORT_BACKOFF_MAX = float(os.getenv("TRANSPORT_BACKOFF_MAX", "30"))
+TRANSPORT_GZIP_MIN = int(os.getenv("TRANSPORT_GZIP_MIN", "1024"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "60"))
+
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+class CircuitOpenError(requests.ConnectionError):
+    """The backend is considered offline, the call was not attempted"""
+
+class Transport:
+    def __init__(self, base_url="", retries=TRANSPORT_RETRIES, backoff=TRANSPORT_BACKOFF,
+                 gzip_min=TRANSPORT_GZIP_MIN, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN,
+                 pool_size=4):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.gzip_min = gzip_min
+        self.failure_threshold = failures
+        self.cooldown = cooldown
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "ZeroTrustAgent"
+        # Retries are handled here, with backoff and the breaker in the loop
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial = False
+        self.requests = 0
+        self.retried = 0
+        self.failures = 0
+        self.rejected = 0
+        self.breaker_opened = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+
+    @property
+    def online(self):
+        return self._opened_at is None
+
+    def _url(self, path):
+        return path if path.startswith(("http://", "https://")) else f"{self.base_url}{path}"
+
+    def _before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self._trial or time.monotonic() - self._opened_at < self.cooldown:
+                self.rejected += 1
+                raise CircuitOpenError(f"backend offline, retrying after {self.cooldown:.0f}s cooldown")
+            # Half-open: let this one call through to probe the backend
+            self._trial = True
+
+    def _record(self, success):
+        with self._lock:
+            self._trial = False
+            if success:
+                self._consecutive_failures = 0
+                self._opened_at = None
+                return
+            self.failures += 1
+            self._consecutive_failures += 1
+            if self._opened_at is not None or self._consecutive_failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    self.breaker_opened += 1
+                self._opened_at = time.monotonic()
+
+    def _delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), TRANSPORT_BACKOFF_MAX)
+        # Full jitter, so agents that lost the backend together do not retry in lockstep
+        return random.uniform(0, min(TRANSPORT_BACKOFF_MAX, self.backoff * 2 ** attempt))
+
+    def _body(self, json_body, data, headers):
+        if json_body is not None:
+            data = json.dumps(json_body).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json")
+        elif isinstance(data, str):
+            data = data.encode("utf-8")
+        if data and len(data) >= self.gzip_min and "Content-Encoding" not in headers:
+            compressed = gzip.compress(data, compresslevel=6)
+            if len(compressed) < len(data):
+                self.bytes_saved += len(data) - len(compressed)
+                headers["Content-Encoding"] = "gzip"
+                data = compressed
+        return data
+
+    def request(self, method, path, json=None, data=None, headers=None, timeout=10, retries=None):
+        """
+        Send a request, retrying transient failures. Returns the last response,
+        raises the last error if no response was received at all.
+        """
+        headers = dict(headers or {})
+        data = self._body(json, data, headers)
+        self._before_call()
+        retries = self.retries if retries is None else retries
+        url = self._url(path)
+
+        response, error = None, None
+        for attempt in range(retries + 1):
+            if attempt:
+                self.retried += 1
+                time.sleep(self._delay(attempt - 1, response))
+            self.requests += 1
+            self.bytes_sent += len(data or b"")
+            try:
+                response, error = self.session.request(method, url, data=data, headers=headers, timeout=timeout), None
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response, error = None, e
+                continue
+            except requests.RequestException:
+                self._record(False)
+                raise
+            if response.status_code not in RETRY_STATUSES:
+                self._record(True)
+                return response
+
+        self._record(False)
+        if response is not None:
+            return response
+        raise error
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def stats(self):
+        return {
+            "online": self.online,
+            "requests": self.requests,
+            "retried": self.retried,
+            "failures": self.failures,
+            "rejected_offline": self.rejected,
+            "breaker_opened": self.breaker_opened,
+            "bytes_sent": self.bytes_sent,
+            "bytes_saved_gzip": self.bytes_saved,
+        }
+
+    def close(self):
+        self.session.close()
@@ -11,27 +11,41 @@ import socket
 import platform
 import uuid
 import hashlib
-import requests
 import json
 from datetime import datetime
 from pathlib import Path
 import psutil
+from ip_classifier import classifier
+from file_events import create_watcher
+from path_matcher import PathMatcher
+from dedup import DedupCache
+from transport import Transport
+from spool import Spool, SpoolUploader
 
 # Configuration
 BACKEND_URL = "https://zero-trust-3fmw.onrender.com"
 USERNAME = None  # Set via command line
 CHECK_INTERVAL = 300  # 5 minutes
+transport = Transport(BACKEND_URL)
+# Substrings, "dir:<name>" path components or "glob:<pattern>", see path_matcher.py
 SENSITIVE_PATHS = [
     "Documents", "Desktop", "Downloads", 
-    "confidential", "secret", "private", "payroll", "hr"
+    "confidential", "secret", "private", "payroll", "dir:hr"
 ]
+SENSITIVE_MATCHER = PathMatcher(SENSITIVE_PATHS)
+# Directories streamed by the file watcher: the SENSITIVE_PATHS folders in the home directory
+WATCH_ROOTS = [Path.home() / name for name in SENSITIVE_PATHS if ":" not in name]
 
 class ZeroTrustAgent:
     def __init__(self, username):
         self.username = username
         self.device_id = self.get_device_id()
         self.last_login_time = datetime.now()
-        self.file_access_cache = set()
+        self.file_access_cache = DedupCache()
+        self.file_watcher = None
+        # Telemetry goes to disk first and is uploaded in the background
+        self.spool = Spool()
+        self.uploader = SpoolUploader(self.spool, transport)
         
     def get_device_id(self):
         """Generate unique device fingerprint"""
@@ -80,8 +94,8 @@ class ZeroTrustAgent:
             return False
         
         try:
-            response = requests.post(
-                f"{BACKEND_URL}/device/register",
+            response = transport.post(
+                "/device/register",
                 json=device_info,
                 timeout=10
             )
@@ -96,29 +110,25 @@ class ZeroTrustAgent:
             return False
     
     def monitor_file_access(self):
-        """Monitor file system access"""
+        """Collect sensitive file events seen by the file watcher since the last cycle"""
         suspicious_files = []
         
         try:
-            # Monitor recent file operations
-            for proc in psutil.process_iter(['pid', 'name', 'open_files']):
-                try:
-                    if proc.info['open_files']:
-                        for file in proc.info['open_files']:
-                            file_path = file.path.lower()
-                            
-                            # Check if accessing sensitive paths
-                            if any(sensitive in file_path for sensitive in SENSITIVE_PATHS):
-                                file_key = f"{file.path}-{datetime.now().strftime('%Y%m%d%H')}"
-                                if file_key not in self.file_access_cache:
-                                    suspicious_files.append({
-                                        "file_name": file.path,
-                                        "action": "READ",
-                                        "process": proc.info['name']
-                                    })
-                                    self.file_access_cache.add(file_key)
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
+            if self.file_watcher is None:
+                self.file_watcher = create_watcher(WATCH_ROOTS)
+                print(f"[OK] File monitoring: {self.file_watcher.backend}")
+            
+            for event in self.file_watcher.drain():
+                # Check if accessing sensitive paths
+                if SENSITIVE_MATCHER.matches(event.path):
+                    # Report each file and action at most once per dedup window
+                    if not self.file_access_cache.seen(event.path, event.action, now=event.time):
+                        suspicious_files.append({
+                            "file_name": event.path,
+                            "action": event.action,
+                            "process": event.process,
+                            "timestamp": datetime.fromtimestamp(event.time).isoformat()
+                        })
         except Exception as e:
             print(f"[ERROR] File monitoring failed: {e}")
         
@@ -146,16 +156,10 @@ class ZeroTrustAgent:
         try:
             # Check for external connections
             connections = psutil.net_connections(kind='inet')
-            external_ips = set()
-            
-            for conn in connections:
-                if conn.raddr and conn.status == 'ESTABLISHED':
-                    remote_ip = conn.raddr.ip
-                    # Check if external (not private IP)
-                    if not (remote_ip.startswith('10.') or 
-                           remote_ip.startswith('192.168.') or 
-                           remote_ip.startswith('172.')):
-                        external_ips.add(remote_ip)
+            remote_ips = [conn.raddr.ip for conn in connections
+                          if conn.raddr and conn.status == 'ESTABLISHED']
+            # Check if external (not private, loopback or corporate)
+            external_ips = classifier.external(remote_ips)
             
             if len(external_ips) > 10:
                 anomalies.append("EXCESSIVE_EXTERNAL_CONNECTIONS")
@@ -181,22 +185,22 @@ class ZeroTrustAgent:
         return anomalies
     
     def send_telemetry(self, files, anomalies):
-        """Send collected data to backend"""
+        """Spool collected data for the background uploader"""
         try:
-            # Send file access logs
-            for file_data in files:
-                requests.post(
-                    f"{BACKEND_URL}/files/access",
-                    json={
-                        "user_id": self.username,
-                        "file_name": file_data["file_name"],
-                        "action": file_data["action"]
-                    },
-                    timeout=5
-                )
-            
+            # Written to disk first, so nothing is lost while the backend is unreachable.
+            # The uploader sends it as NDJSON batches in the order it was recorded.
             if files:
-                print(f"[OK] Sent {len(files)} file access logs")
+                self.spool.append([{
+                    "user_id": self.username,
+                    "file_name": file_data["file_name"],
+                    "action": file_data["action"],
+                    "timestamp": file_data["timestamp"]
+                } for file_data in files])
+                self.uploader.wake()
+                stats = self.uploader.stats()
+                print(f"[OK] Spooled {len(files)} file access logs, {stats['pending']} awaiting upload")
+                if stats["last_error"]:
+                    print(f"[WARN] Upload pending: {stats['last_error']}")
             
             if anomalies:
                 print(f"[ALERT] Detected anomalies: {', '.join(anomalies)}")
@@ -217,7 +221,12 @@ class ZeroTrustAgent:
         
         # Register device
         if not self.register_device():
-            print("[WARN] Running in offline mode")
+            print("[WARN] Running in offline mode, telemetry is spooled until the backend is reachable")
+        
+        pending = self.spool.stats()["pending"]
+        if pending:
+            print(f"[INFO] {pending} spooled events from a previous run will be uploaded")
+        self.uploader.start()
         
         print(f"\n[OK] Agent started. Monitoring activity...\n")
         
@@ -229,6 +238,9 @@ class ZeroTrustAgent:
                 
                 # Collect data
                 files = self.monitor_file_access()
+                dedup = self.file_access_cache.stats()
+                print(f"  File events: {len(files)} new, {dedup['suppressed']} repeats suppressed "
+                      f"({dedup['suppression_rate']:.0%}), {dedup['entries']} tracked, {dedup['evicted']} evicted")
                 login_anomalies = self.check_login_anomalies()
                 network_anomalies = self.check_network_anomalies()
                 usb_anomalies = self.check_usb_devices()
@@ -246,6 +258,10 @@ class ZeroTrustAgent:
                 
             except KeyboardInterrupt:
                 print("\n[OK] Agent stopped by user")
+                if self.file_watcher:
+                    self.file_watcher.stop()
+                self.uploader.stop()
+                self.spool.close()
                 break
             except Exception as e:
                 print(f"[ERROR] Monitoring error: {e}")
@@ -11,12 +11,14 @@ import socket
 import platform
 import uuid
 import hashlib
-import requests
 import psutil
+from ip_classifier import classifier
+from transport import Transport
 from datetime import datetime
 import time
 
 BACKEND_URL = "https://zero-trust-3fmw.onrender.com"
+transport = Transport(BACKEND_URL)
 CHECK_INTERVAL = 300
 
 class ZeroTrustGUI:
@@ -198,8 +200,8 @@ Backend:   {BACKEND_URL}
                 "ip_address": ip
             }
             
-            response = requests.post(f"{BACKEND_URL}/device/register", 
-                                    json=device_info, timeout=10)
+            response = transport.post("/device/register", 
+                                     json=device_info, timeout=10)
             
             if response.status_code == 200:
                 self.log(f"Device registered: {hostname}", '#00ff00')
@@ -236,14 +238,9 @@ Backend:   {BACKEND_URL}
                 # Check network connections
                 try:
                     connections = psutil.net_connections(kind='inet')
-                    external_ips = set()
-                    for conn in connections:
-                        if conn.raddr and conn.status == 'ESTABLISHED':
-                            remote_ip = conn.raddr.ip
-                            if not (remote_ip.startswith('10.') or 
-                                   remote_ip.startswith('192.168.') or 
-                                   remote_ip.startswith('172.')):
-                                external_ips.add(remote_ip)
+                    remote_ips = [conn.raddr.ip for conn in connections
+                                  if conn.raddr and conn.status == 'ESTABLISHED']
+                    external_ips = classifier.external(remote_ips)
                     
                     if len(external_ips) > 10:
                         anomalies.append("EXCESSIVE_EXTERNAL_CONNECTIONS")
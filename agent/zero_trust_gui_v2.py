@@ -11,13 +11,15 @@ import socket
 import platform
 import uuid
 import hashlib
-import requests
 import psutil
+from ip_classifier import EXTERNAL, classifier
+from transport import Transport
 from datetime import datetime
 import time
 import webbrowser
 
 BACKEND_URL = "https://zero-trust-3fmw.onrender.com"
+transport = Transport(BACKEND_URL)
 CHECK_INTERVAL = 60  # 1 minute for demo
 
 class ModernButton(tk.Button):
@@ -287,8 +289,8 @@ Backend:   Connected
         # Check network
         try:
             connections = psutil.net_connections(kind='inet')
-            external = sum(1 for c in connections if c.raddr and c.status == 'ESTABLISHED' 
-                          and not c.raddr.ip.startswith(('10.', '192.168.', '172.')))
+            remote_ips = [c.raddr.ip for c in connections if c.raddr and c.status == 'ESTABLISHED']
+            external = classifier.classify_many(remote_ips).count(EXTERNAL)
             if external > 10:
                 threats.append((f"🌐 {external} external connections", 'warning', 15))
         except:
@@ -342,7 +344,7 @@ Backend:   Connected
                 "wifi_ssid": "Unknown",
                 "ip_address": socket.gethostbyname(socket.gethostname())
             }
-            requests.post(f"{BACKEND_URL}/device/register", json=device_info, timeout=10)
+            transport.post("/device/register", json=device_info, timeout=10)
             self.log("✓ Device registered with backend", 'success')
         except:
             self.log("⚠️ Running in offline mode", 'warning')
@@ -11,13 +11,15 @@ import socket
 import platform
 import uuid
 import hashlib
-import requests
 import psutil
+from ip_classifier import EXTERNAL, classifier
+from transport import Transport
 from datetime import datetime
 import time
 import webbrowser
 
 BACKEND_URL = "https://zero-trust-3fmw.onrender.com"
+transport = Transport(BACKEND_URL)
 CHECK_INTERVAL = 60
 
 class ZeroTrustPro:
@@ -366,7 +368,7 @@ RECOMMENDATIONS:
         
         # Fetch blockchain data
         try:
-            response = requests.get(f"{BACKEND_URL}/audit/chain", timeout=5)
+            response = transport.get("/audit/chain", timeout=5, retries=0)
             if response.status_code == 200:
                 data = response.json()
                 
@@ -425,7 +427,7 @@ RECOMMENDATIONS:
         
         # Fetch zones data
         try:
-            response = requests.get(f"{BACKEND_URL}/zones", timeout=5)
+            response = transport.get("/zones", timeout=5, retries=0)
             if response.status_code == 200:
                 data = response.json()
                 zones = data.get('zones', [])
@@ -535,8 +537,8 @@ Backend:    Active
         # Check network
         try:
             connections = psutil.net_connections(kind='inet')
-            external = sum(1 for c in connections if c.raddr and c.status == 'ESTABLISHED' 
-                          and not c.raddr.ip.startswith(('10.', '192.168.', '172.')))
+            remote_ips = [c.raddr.ip for c in connections if c.raddr and c.status == 'ESTABLISHED']
+            external = classifier.classify_many(remote_ips).count(EXTERNAL)
             if external > 10:
                 threats.append((f"🌐 {external} external connections detected", 'warning', 15))
         except:
@@ -588,7 +590,7 @@ Backend:    Active
                 "wifi_ssid": "Unknown",
                 "ip_address": socket.gethostbyname(socket.gethostname())
             }
-            requests.post(f"{BACKEND_URL}/device/register", json=device_info, timeout=10)
+            transport.post("/device/register", json=device_info, timeout=10)
             self.log("✓ Device registered with backend", 'success')
         except:
             self.log("⚠️ Running in offline mode", 'warning')
@@ -1,50 +1,64 @@
 from fastapi import APIRouter, Request
 from datetime import datetime
 from database import get_db
+from geolocation import offline_geo, GEOIP_REMOTE_FALLBACK
+from ip_classifier import classifier
 import psycopg2.extras
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
 @router.post("/login")
 async def login(request: Request, username: str, password: str):
-    db = get_db()
-    cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    
-    cursor.execute("SELECT * FROM users WHERE username=%s AND password=%s", (username, password))
-    user = cursor.fetchone()
+    with get_db() as db:
+        cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cursor.execute("SELECT * FROM users WHERE username=%s AND password=%s", (username, password))
+        user = cursor.fetchone()
+        cursor.close()
     
     success = bool(user)
     ip = request.client.host
     
-    # Get real public IP if behind proxy/NAT
-    real_ip = ip
-    try:
-        import requests
-        public_ip_response = requests.get("https://api.ipify.org?format=json", timeout=3).json()
-        real_ip = public_ip_response.get("ip", ip)
-    except:
-        pass
-    
-    # Get geolocation from real public IP
     country = "Unknown"
     city = "Unknown"
+    real_ip = ip
     
-    try:
-        import requests
-        # Try ip-api.com with real public IP
-        geo = requests.get(f"http://ip-api.com/json/{real_ip}", timeout=3).json()
-        if geo.get("status") == "success":
-            country = geo.get("country", "Unknown")
-            city = geo.get("city", "Unknown")
-            lat = geo.get("lat")
-            lon = geo.get("lon")
-            if lat and lon:
-                city = f"{city} ({lat:.2f}, {lon:.2f})"
-    except:
-        pass
+    # Try the local IP-range database first, it needs no network
+    location = offline_geo.lookup(ip) if offline_geo else None
+    if location:
+        country = location["country"]
+        city = location["city"]
+        lat = location["latitude"]
+        lon = location["longitude"]
+        if lat and lon:
+            city = f"{city} ({lat:.2f}, {lon:.2f})"
+    
+    # Get real public IP if behind proxy/NAT
+    if country == "Unknown" and GEOIP_REMOTE_FALLBACK:
+        try:
+            import requests
+            public_ip_response = requests.get("https://api.ipify.org?format=json", timeout=3).json()
+            real_ip = public_ip_response.get("ip", ip)
+        except:
+            pass
+    
+    # Get geolocation from real public IP
+    if country == "Unknown" and GEOIP_REMOTE_FALLBACK:
+        try:
+            import requests
+            # Try ip-api.com with real public IP
+            geo = requests.get(f"http://ip-api.com/json/{real_ip}", timeout=3).json()
+            if geo.get("status") == "success":
+                country = geo.get("country", "Unknown")
+                city = geo.get("city", "Unknown")
+                lat = geo.get("lat")
+                lon = geo.get("lon")
+                if lat and lon:
+                    city = f"{city} ({lat:.2f}, {lon:.2f})"
+        except:
+            pass
     
     # If still unknown, try ipapi.co
-    if country == "Unknown":
+    if country == "Unknown" and GEOIP_REMOTE_FALLBACK:
         try:
             import requests
             geo = requests.get(f"https://ipapi.co/{real_ip}/json/", timeout=3).json()
@@ -58,17 +72,18 @@ async def login(request: Request, username: str, password: str):
             pass
     
     # If still unknown and local IP, mark as local
-    if country == "Unknown" and (ip.startswith(("127.", "10.", "192.168.", "172.")) or ip in ["localhost", "::1"]):
+    if country == "Unknown" and (classifier.is_internal(ip) or ip == "localhost"):
         country = "Local Network"
         city = "Private IP"
     
-    cursor.execute("""
-        INSERT INTO login_logs (user_id, login_time, ip_address, success, country, city)
-        VALUES (%s,%s,%s,%s,%s,%s)
-    """, (username, datetime.now(), real_ip, success, country, city))
-    db.commit()
-    cursor.close()
-    db.close()
+    with get_db() as db:
+        cursor = db.cursor()
+        cursor.execute("""
+            INSERT INTO login_logs (user_id, login_time, ip_address, success, country, city)
+            VALUES (%s,%s,%s,%s,%s,%s)
+        """, (username, datetime.now(), real_ip, success, country, city))
+        db.commit()
+        cursor.close()
     
     if not success:
         return {"status": "FAIL"}
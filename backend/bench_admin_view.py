@@ -0,0 +1,167 @@
+"""
+Benchmark the /security/analyze/admin query.
+Seeds a throwaway schema with login/device rows and compares the old
+correlated-subquery SELECT, the LATERAL rewrite over the raw logs and
+metrics.ADMIN_OVERVIEW_SQL, which reads the trigger-maintained rollups.
+
+Usage: python bench_admin_view.py [login_rows] [users]
+"""
+
+import os
+import sys
+import time
+import statistics
+import psycopg2
+
+from metrics import ADMIN_OVERVIEW_SQL
+from rollup import create_rollups
+
+BENCH_SCHEMA = "bench_admin_view"
+RUNS = 3
+
+LEGACY_ADMIN_VIEW_SQL = """
+    SELECT DISTINCT l.user_id,
+    (SELECT COUNT(*) FROM login_logs WHERE user_id=l.user_id) as total_logins,
+    (SELECT MAX(login_time) FROM login_logs WHERE user_id=l.user_id) as last_login,
+    (SELECT ip_address FROM login_logs WHERE user_id=l.user_id ORDER BY login_time DESC LIMIT 1) as ip_address,
+    (SELECT country FROM login_logs WHERE user_id=l.user_id ORDER BY login_time DESC LIMIT 1) as country,
+    (SELECT city FROM login_logs WHERE user_id=l.user_id ORDER BY login_time DESC LIMIT 1) as city,
+    (SELECT mac_address FROM device_logs WHERE user_id=l.user_id ORDER BY first_seen DESC LIMIT 1) as mac_address,
+    (SELECT wifi_ssid FROM device_logs WHERE user_id=l.user_id ORDER BY first_seen DESC LIMIT 1) as wifi_ssid,
+    (SELECT hostname FROM device_logs WHERE user_id=l.user_id ORDER BY first_seen DESC LIMIT 1) as hostname,
+    (SELECT os FROM device_logs WHERE user_id=l.user_id ORDER BY first_seen DESC LIMIT 1) as os,
+    (SELECT status FROM users WHERE username=l.user_id) as status
+    FROM login_logs l
+"""
+
+LATERAL_ADMIN_VIEW_SQL = """
+    WITH totals AS (
+        SELECT user_id,
+               COUNT(*) AS total_logins,
+               MAX(login_time) AS last_login
+        FROM login_logs
+        GROUP BY user_id
+    )
+    SELECT t.user_id, t.total_logins, t.last_login,
+           ll.ip_address, ll.country, ll.city,
+           dl.mac_address, dl.wifi_ssid, dl.hostname, dl.os,
+           u.status
+    FROM totals t
+    LEFT JOIN LATERAL (
+        SELECT ip_address, country, city FROM login_logs
+        WHERE user_id=t.user_id ORDER BY login_time DESC LIMIT 1
+    ) ll ON true
+    LEFT JOIN LATERAL (
+        SELECT mac_address, wifi_ssid, hostname, os FROM device_logs
+        WHERE user_id=t.user_id ORDER BY first_seen DESC LIMIT 1
+    ) dl ON true
+    LEFT JOIN users u ON u.username = t.user_id
+"""
+
+def seed(cursor, login_rows, users):
+    cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+    cursor.execute(f"SET search_path TO {BENCH_SCHEMA}")
+
+    cursor.execute("""
+        CREATE TABLE users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            status VARCHAR(20) DEFAULT 'active'
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE login_logs (
+            id SERIAL PRIMARY KEY,
+            user_id VARCHAR(50) NOT NULL,
+            login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ip_address VARCHAR(45),
+            success BOOLEAN DEFAULT FALSE,
+            country VARCHAR(100) DEFAULT 'Unknown',
+            city VARCHAR(100) DEFAULT 'Unknown'
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE device_logs (
+            id SERIAL PRIMARY KEY,
+            user_id VARCHAR(50) NOT NULL,
+            mac_address VARCHAR(17),
+            os VARCHAR(50),
+            first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            wifi_ssid VARCHAR(100),
+            hostname VARCHAR(100)
+        )
+    """)
+
+    cursor.execute("""
+        INSERT INTO users (username)
+        SELECT 'user' || g FROM generate_series(1, %s) g
+    """, (users,))
+    cursor.execute("""
+        INSERT INTO login_logs (user_id, login_time, ip_address, success, country, city)
+        SELECT 'user' || (g %% %s + 1),
+               NOW() - (g || ' seconds')::interval,
+               '10.0.' || (g %% 250) || '.' || (g %% 200),
+               g %% 7 <> 0,
+               'Country' || (g %% 20),
+               'City' || (g %% 90)
+        FROM generate_series(1, %s) g
+    """, (users, login_rows))
+    cursor.execute("""
+        INSERT INTO device_logs (user_id, mac_address, os, first_seen, wifi_ssid, hostname)
+        SELECT 'user' || (g %% %s + 1),
+               'aa:bb:cc:dd:ee:' || lpad(to_hex(g %% 256), 2, '0'),
+               'Linux',
+               NOW() - (g || ' minutes')::interval,
+               'corp-wifi',
+               'host' || g
+        FROM generate_series(1, %s) g
+    """, (users, users * 3))
+
+    # Same indexes as schema_postgres.sql
+    cursor.execute("CREATE INDEX idx_login_user ON login_logs(user_id)")
+    cursor.execute("CREATE INDEX idx_login_time ON login_logs(login_time)")
+    cursor.execute("CREATE INDEX idx_device_user ON device_logs(user_id)")
+    # Builds and backfills the rollup tables from the rows above
+    create_rollups(cursor)
+    cursor.execute("ANALYZE")
+
+def time_query(cursor, sql):
+    timings = []
+    rows = 0
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        cursor.execute(sql)
+        rows = len(cursor.fetchall())
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), rows
+
+def main():
+    login_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+
+    conn = psycopg2.connect(os.getenv("DATABASE_URL", "postgresql://localhost/zero"))
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    try:
+        print(f"Seeding {login_rows} login rows for {users} users...")
+        seed(cursor, login_rows, users)
+
+        new_time, new_rows = time_query(cursor, ADMIN_OVERVIEW_SQL)
+        print(f"Rollup query:     {new_time * 1000:10.1f} ms  ({new_rows} rows)")
+
+        lateral_time, lateral_rows = time_query(cursor, LATERAL_ADMIN_VIEW_SQL)
+        print(f"LATERAL query:    {lateral_time * 1000:10.1f} ms  ({lateral_rows} rows)")
+
+        old_time, old_rows = time_query(cursor, LEGACY_ADMIN_VIEW_SQL)
+        print(f"Correlated query: {old_time * 1000:10.1f} ms  ({old_rows} rows)")
+
+        print(f"Speedup: {lateral_time / new_time:.1f}x over LATERAL, {old_time / new_time:.1f}x over correlated")
+    finally:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
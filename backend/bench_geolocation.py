@@ -0,0 +1,86 @@
+"""
+Benchmark offline IP-range lookups against the remote ipapi.co path.
+Generates a synthetic range database, times OfflineGeoDB lookups and
+then times a handful of live lookup_remote calls for comparison.
+
+Usage: python bench_geolocation.py [ranges] [lookups]
+"""
+
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+from offline_geo import OfflineGeoDB
+from geolocation import lookup_remote
+
+REMOTE_SAMPLE = ["8.8.8.8", "1.1.1.1", "9.9.9.9", "208.67.222.222", "2001:4860:4860::8888"]
+
+def write_ranges(path, ranges):
+    rng = random.Random(42)
+    v4_step = (1 << 32) // ranges
+    v6_ranges = max(ranges // 10, 1)
+    v6_step = (1 << 128) // v6_ranges
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["start_ip", "end_ip", "country", "city", "region",
+                         "latitude", "longitude", "timezone", "isp", "postal", "ip_version"])
+        for i in range(ranges):
+            start = i * v4_step
+            writer.writerow([start, start + v4_step - 1, f"Country{i % 200}", f"City{i % 5000}",
+                             f"Region{i % 900}", round(rng.uniform(-90, 90), 4),
+                             round(rng.uniform(-180, 180), 4), "UTC", f"ISP{i % 300}", "", 4])
+        for i in range(v6_ranges):
+            start = i * v6_step
+            writer.writerow([start, start + v6_step - 1, f"Country{i % 200}", f"City{i % 5000}",
+                             f"Region{i % 900}", 0, 0, "UTC", f"ISP{i % 300}", "", 6])
+
+def random_ips(count):
+    rng = random.Random(7)
+    ips = []
+    for i in range(count):
+        if i % 10 == 0:
+            ips.append(":".join(f"{rng.getrandbits(16):x}" for _ in range(8)))
+        else:
+            ips.append(".".join(str(rng.getrandbits(8)) for _ in range(4)))
+    return ips
+
+def main():
+    ranges = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        write_ranges(path, ranges)
+
+        started = time.perf_counter()
+        db = OfflineGeoDB.load(path)
+        print(f"Loaded {len(db)} ranges in {time.perf_counter() - started:.2f}s")
+
+        ips = random_ips(lookups)
+        found = 0
+        started = time.perf_counter()
+        for ip in ips:
+            if db.find(ip) is not None:
+                found += 1
+        elapsed = time.perf_counter() - started
+        print(f"Offline: {lookups} lookups in {elapsed:.2f}s "
+              f"({elapsed / lookups * 1e9:.0f} ns/lookup, {found} found)")
+
+        timings = []
+        for ip in REMOTE_SAMPLE:
+            started = time.perf_counter()
+            lookup_remote(ip)
+            timings.append(time.perf_counter() - started)
+        avg = sum(timings) / len(timings)
+        print(f"Remote:  {len(timings)} lookups, {avg * 1000:.1f} ms/lookup on average")
+        print(f"Offline is ~{avg / (elapsed / lookups):,.0f}x faster per lookup")
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark calculate_risk_score with and without init_db.LOG_INDEXES.
+Seeds a throwaway schema with login and file access rows spread over
+90 days, times per-user risk scoring with only the primary keys, then
+adds the composite/partial indexes and times it again.
+
+Usage: python bench_risk_indexes.py [rows] [users] [samples]
+"""
+
+import os
+import random
+import sys
+import time
+import statistics
+import psycopg2
+
+from init_db import LOG_INDEXES
+from main import calculate_risk_score
+
+BENCH_SCHEMA = "bench_risk_indexes"
+
+def seed(cursor, rows, users):
+    cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+    cursor.execute(f"SET search_path TO {BENCH_SCHEMA}")
+
+    cursor.execute("""
+        CREATE TABLE login_logs (
+            id SERIAL PRIMARY KEY,
+            user_id VARCHAR(50) NOT NULL,
+            login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ip_address VARCHAR(45),
+            success BOOLEAN DEFAULT FALSE,
+            country VARCHAR(100) DEFAULT 'Unknown',
+            city VARCHAR(100) DEFAULT 'Unknown'
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE device_logs (
+            id SERIAL PRIMARY KEY,
+            user_id VARCHAR(50) NOT NULL,
+            device_id VARCHAR(255) UNIQUE,
+            mac_address VARCHAR(17),
+            os VARCHAR(50),
+            trusted BOOLEAN DEFAULT FALSE,
+            first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            wifi_ssid VARCHAR(100),
+            hostname VARCHAR(100),
+            ip_address VARCHAR(45)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE file_access_logs (
+            id SERIAL PRIMARY KEY,
+            user_id VARCHAR(50) NOT NULL,
+            file_name VARCHAR(255) NOT NULL,
+            action VARCHAR(10) DEFAULT 'READ',
+            ip_address VARCHAR(45),
+            access_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # 90 days of history, the risk query only looks at the last 1h-7d
+    cursor.execute("""
+        INSERT INTO login_logs (user_id, login_time, ip_address, success, country, city)
+        SELECT 'user' || (g %% %s + 1),
+               NOW() - (random() * 90 * 86400 || ' seconds')::interval,
+               '10.0.' || (g %% 250) || '.' || (g %% 200),
+               g %% 7 <> 0,
+               'Country' || (g %% 20),
+               'City' || (g %% 90)
+        FROM generate_series(1, %s) g
+    """, (users, rows))
+    cursor.execute("""
+        INSERT INTO file_access_logs (user_id, file_name, action, ip_address, access_time)
+        SELECT 'user' || (g %% %s + 1),
+               '/home/docs/file' || (g %% 5000) || '.txt',
+               CASE WHEN g %% 20 = 0 THEN 'DELETE' ELSE 'READ' END,
+               '10.0.0.' || (g %% 250),
+               NOW() - (random() * 90 * 86400 || ' seconds')::interval
+        FROM generate_series(1, %s) g
+    """, (users, rows))
+    cursor.execute("""
+        INSERT INTO device_logs (user_id, device_id, mac_address, os, trusted, first_seen, wifi_ssid, hostname)
+        SELECT 'user' || (g %% %s + 1), 'dev' || g,
+               'aa:bb:cc:dd:ee:' || lpad(to_hex(g %% 256), 2, '0'),
+               'Linux', g %% 3 = 0,
+               NOW() - (g || ' minutes')::interval,
+               'corp-wifi', 'host' || g
+        FROM generate_series(1, %s) g
+    """, (users, users * 3))
+    cursor.execute("ANALYZE")
+
+def time_scoring(conn, usernames):
+    timings = []
+    for username in usernames:
+        started = time.perf_counter()
+        calculate_risk_score(username, conn)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), max(timings)
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    samples = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    conn = psycopg2.connect(os.getenv("DATABASE_URL", "postgresql://localhost/zero"))
+    conn.autocommit = True
+    cursor = conn.cursor()
+    usernames = [f"user{random.randint(1, users)}" for _ in range(samples)]
+
+    try:
+        print(f"Seeding {rows} login rows and {rows} file access rows for {users} users...")
+        seed(cursor, rows, users)
+
+        median, worst = time_scoring(conn, usernames)
+        print(f"Primary keys only:  median {median * 1000:9.1f} ms  max {worst * 1000:9.1f} ms")
+
+        started = time.perf_counter()
+        for name, definition in LOG_INDEXES:
+            cursor.execute(f"CREATE INDEX {name} ON {definition}")
+        cursor.execute("ANALYZE")
+        print(f"Built {len(LOG_INDEXES)} indexes in {time.perf_counter() - started:.1f}s")
+
+        indexed_median, indexed_worst = time_scoring(conn, usernames)
+        print(f"With LOG_INDEXES:   median {indexed_median * 1000:9.1f} ms  max {indexed_worst * 1000:9.1f} ms")
+        print(f"Speedup: {median / indexed_median:.1f}x")
+    finally:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
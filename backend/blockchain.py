@@ -1,29 +1,118 @@
 import hashlib
 import json
+import os
+from collections import deque
 from datetime import datetime
+from merkle import merkle_root
 
-class Block:
-    def __init__(self, index, data, prev_hash):
-        self.index = index
-        self.timestamp = datetime.utcnow().isoformat()
-        self.data = data
-        self.prev_hash = prev_hash
-        self.hash = self.calculate_hash()
+# Blocks kept in memory, older ones are read back from the store
+AUDIT_CHAIN_WINDOW = int(os.getenv("AUDIT_CHAIN_WINDOW", "100"))
 
-    def calculate_hash(self):
-        raw = f"{self.index}{self.timestamp}{json.dumps(self.data)}{self.prev_hash}"
-        return hashlib.sha256(raw.encode()).hexdigest()
+def serialize_block(block):
+    """
+    Canonical bytes a block hash is computed over, the cached 'hash' key is left out.
+    Blocks with a merkle_root are hashed as a header only, the root commits to 'data'.
+    """
+    skip = ('hash', 'data') if 'merkle_root' in block else ('hash',)
+    return json.dumps({k: v for k, v in block.items() if k not in skip}, sort_keys=True)
 
-class AuditChain:
-    def __init__(self):
-        self.chain = [self.genesis()]
+def hash_block(block):
+    return hashlib.sha256(serialize_block(block).encode()).hexdigest()
 
-    def genesis(self):
-        return Block(0, {"event": "GENESIS"}, "0")
+def proof_of_work(previous_proof):
+    """Brute-force the next proof, module level so it can run in a process pool"""
+    new_proof = 1
+    while True:
+        hash_operation = hashlib.sha256(str(new_proof**2 - previous_proof**2).encode()).hexdigest()
+        if hash_operation[:4] == '0000':
+            return new_proof
+        new_proof += 1
 
-    def add_event(self, data):
-        prev = self.chain[-1]
-        block = Block(len(self.chain), data, prev.hash)
+class Blockchain:
+    def __init__(self, store=None, window=AUDIT_CHAIN_WINDOW):
+        self.store = store
+        # Without a store there is nothing to restore from
+        self.restored = store is None
+        self.chain = deque(maxlen=window)
+        genesis = self._build_block(1, proof=1, previous_hash='0')
+        genesis['hash'] = self.hash(genesis)
+        self.chain.append(genesis)
+    
+    def restore(self):
+        """Continue from the stored chain tip instead of the in-memory genesis block"""
+        if not self.store:
+            return
+        self.store.resume()
+        tip = self.store.tip()
+        if tip:
+            self.chain.clear()
+            self.chain.append(tip)
+        else:
+            self.store.append(self.chain[0])
+        self.restored = True
+    
+    def ensure_writable(self):
+        """
+        Raise unless a new block can be sealed on top of the stored chain:
+        restores first if startup could not, or after another writer forked it
+        """
+        if not self.store:
+            return
+        if not self.restored or self.store.forked:
+            self.restore()
+        self.store.check_writable()
+    
+    def _build_block(self, index, proof, previous_hash, data=None):
+        return {
+            'index': index,
+            'timestamp': str(datetime.now()),
+            'proof': proof,
+            'previous_hash': previous_hash,
+            'merkle_root': merkle_root(data or []),
+            'data': data or []
+        }
+    
+    def create_block(self, proof, previous_hash, data=None):
+        tip = self.get_previous_block()
+        block = self._build_block(tip['index'] + 1 if tip else 1, proof, previous_hash, data)
+        # Hashed once here, readers use the cached value
+        block['hash'] = self.hash(block)
+        # Stored first, so a refused block never becomes the in-memory tip
+        if self.store:
+            self.store.append(block)
         self.chain.append(block)
-
-audit_chain = AuditChain()
+        return block
+    
+    def get_previous_block(self):
+        return self.chain[-1] if self.chain else None
+    
+    def recent(self, count):
+        """The last `count` blocks, oldest first"""
+        blocks = list(self.chain)[-count:]
+        tip = self.get_previous_block()
+        if self.store and len(blocks) < count and tip['index'] > len(blocks):
+            blocks = self.store.range(max(tip['index'] - count + 1, 1), tip['index'])
+        return blocks
+    
+    def proof_of_work(self, previous_proof):
+        return proof_of_work(previous_proof)
+    
+    def find_transaction(self, tx_id):
+        """(block, position) of a sealed transaction, or None"""
+        for block in reversed(self.chain):
+            for position, tx in enumerate(block['data']):
+                if isinstance(tx, dict) and tx.get('id') == tx_id:
+                    return block, position
+        found = self.store.find_transaction(tx_id) if self.store else None
+        if found:
+            height, position = found
+            blocks = self.store.range(height, height)
+            if blocks:
+                return blocks[0], position
+        return None
+    
+    def hash(self, block):
+        return hash_block(block)
+    
+    def block_hash(self, block):
+        return block.get('hash') or self.hash(block)
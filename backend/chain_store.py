@@ -0,0 +1,296 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import psycopg2.extras
+from blockchain import serialize_block, hash_block
+from merkle import merkle_root
+from database import get_db
+
+# Sealed blocks are written in one transaction (one WAL fsync) per batch
+CHAIN_FLUSH_SIZE = int(os.getenv("CHAIN_FLUSH_SIZE", "20"))
+CHAIN_FLUSH_INTERVAL = float(os.getenv("CHAIN_FLUSH_INTERVAL", "2"))
+CHAIN_VERIFY_PAGE = int(os.getenv("CHAIN_VERIFY_PAGE", "5000"))
+# Blocks waiting for the database before the sealer stops sealing new ones
+CHAIN_BUFFER_MAX = int(os.getenv("CHAIN_BUFFER_MAX", "1000"))
+
+class ChainStoreError(Exception):
+    """New blocks cannot be stored right now, the sealer keeps its transactions and retries"""
+
+def _row_to_block(row):
+    block, block_hash, data = row
+    if isinstance(block, str):
+        block = json.loads(block)
+    if data is not None:
+        block['data'] = json.loads(data) if isinstance(data, str) else data
+    block['hash'] = block_hash or hash_block(block)
+    return block
+
+class PostgresChainStore:
+    """Append-only audit block storage in the audit_blocks table, indexed by height"""
+
+    def __init__(self, flush_size=CHAIN_FLUSH_SIZE, flush_interval=CHAIN_FLUSH_INTERVAL, max_buffered=CHAIN_BUFFER_MAX):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        # Set when another writer already stored blocks at our heights, cleared by Blockchain.restore()
+        self.forked = False
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self.blocks_written = 0
+        self.flushes = 0
+        self.forked_blocks = 0
+
+    def start(self):
+        if self._thread:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._flush_loop, name="chain-store", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._thread:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def resume(self):
+        """Accept blocks again after a fork, once the forked ones are safely in audit_forks"""
+        with self._cond:
+            if self.forked and self._buffer:
+                raise ChainStoreError("Forked audit blocks are not saved to audit_forks yet")
+            self.forked = False
+
+    def check_writable(self):
+        """Raise ChainStoreError if a new block would be lost or pile up in memory"""
+        with self._cond:
+            if self.forked:
+                raise ChainStoreError("Audit chain forked, waiting to resume from the stored tip")
+            if len(self._buffer) >= self.max_buffered:
+                raise ChainStoreError(f"{len(self._buffer)} audit blocks waiting for the database")
+
+    def append(self, block):
+        """Buffer a sealed block, the flusher thread writes it out"""
+        with self._cond:
+            if self.forked:
+                raise ChainStoreError("Audit chain forked, waiting to resume from the stored tip")
+            self._buffer.append(block)
+            if len(self._buffer) >= self.flush_size:
+                self._cond.notify()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._buffer) < self.flush_size:
+                    self._cond.wait(self.flush_interval)
+                if self._stopping:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Chain store flush error: {e}")
+                time.sleep(self.flush_interval)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._cond:
+                batch = list(self._buffer)
+            if not batch:
+                return
+            # The stored block text is exactly what the hash covers, so verification
+            # only needs to rehash it. Transactions live in `data` under the merkle_root.
+            rows = [(block['index'], block.get('hash') or hash_block(block), serialize_block(block),
+                     json.dumps(block['data']) if 'merkle_root' in block else None)
+                    for block in batch]
+            with get_db() as db:
+                cursor = db.cursor()
+                stored = psycopg2.extras.execute_values(cursor, """
+                    INSERT INTO audit_blocks (height, hash, block, data) VALUES %s
+                    ON CONFLICT (height) DO NOTHING RETURNING height
+                """, rows, fetch=True)
+                if len(stored) < len(rows):
+                    db.rollback()
+                    self._fork(db, cursor, {height for (height,) in stored})
+                    return
+                transactions = [(tx['id'], block['index'], position)
+                                for block in batch
+                                for position, tx in enumerate(block['data'])
+                                if isinstance(tx, dict) and tx.get('id')]
+                if transactions:
+                    psycopg2.extras.execute_values(cursor, """
+                        INSERT INTO audit_transactions (tx_id, height, position) VALUES %s
+                        ON CONFLICT (tx_id) DO NOTHING
+                    """, transactions)
+                db.commit()
+                cursor.close()
+            with self._cond:
+                del self._buffer[:len(batch)]
+            self.blocks_written += len(batch)
+            self.flushes += 1
+
+    def _fork(self, db, cursor, stored):
+        # Another process sealed these heights (a second worker, or a restore that
+        # failed at startup). Everything buffered builds on our copy of the chain,
+        # so keep all of it in audit_forks for inspection instead of dropping it
+        with self._cond:
+            self.forked = True  # Nothing more is appended on top of our copy
+            forked = list(self._buffer)
+        psycopg2.extras.execute_values(cursor, """
+            INSERT INTO audit_forks (height, hash, block, data) VALUES %s
+        """, [(block['index'], block.get('hash') or hash_block(block), serialize_block(block),
+               json.dumps(block['data']) if 'merkle_root' in block else None)
+              for block in forked])
+        db.commit()
+        cursor.close()
+        with self._cond:
+            del self._buffer[:len(forked)]
+        self.forked_blocks += len(forked)
+        conflicts = sorted(block['index'] for block in forked if block['index'] not in stored)
+        print(f"[ERROR] Audit chain fork: heights {conflicts[0]}-{conflicts[-1]} already stored by another writer, "
+              f"{len(forked)} blocks kept in audit_forks, sealing resumes from the stored tip")
+
+    def tip(self):
+        """Latest block, without reading the rest of the chain"""
+        with self._cond:
+            if self._buffer:
+                return self._buffer[-1]
+        with get_db() as db:
+            cursor = db.cursor()
+            cursor.execute("SELECT block, hash, data FROM audit_blocks ORDER BY height DESC LIMIT 1")
+            row = cursor.fetchone()
+            cursor.close()
+        return _row_to_block(row) if row else None
+
+    def range(self, start, end):
+        """Blocks with start <= height <= end, in height order"""
+        with get_db() as db:
+            cursor = db.cursor()
+            cursor.execute("""
+                SELECT block, hash, data FROM audit_blocks WHERE height BETWEEN %s AND %s ORDER BY height
+            """, (start, end))
+            blocks = [_row_to_block(row) for row in cursor.fetchall()]
+            cursor.close()
+        with self._cond:
+            pending = [b for b in self._buffer if start <= b['index'] <= end]
+        stored = {b['index'] for b in blocks}
+        return blocks + [b for b in pending if b['index'] not in stored]
+
+    def find_transaction(self, tx_id):
+        """(height, position) of a sealed transaction, or None"""
+        with self._cond:
+            for block in self._buffer:
+                for position, tx in enumerate(block['data']):
+                    if isinstance(tx, dict) and tx.get('id') == tx_id:
+                        return block['index'], position
+        with get_db() as db:
+            cursor = db.cursor()
+            cursor.execute("SELECT height, position FROM audit_transactions WHERE tx_id=%s", (tx_id,))
+            row = cursor.fetchone()
+            cursor.close()
+        return tuple(row) if row else None
+
+    def verify(self, from_height=None, to_height=None, page_size=CHAIN_VERIFY_PAGE):
+        """
+        Check block hashes and hash links in height order.
+        Without from_height this resumes after the last verified checkpoint, and
+        a clean run up to the tip moves the checkpoint forward.
+        """
+        self.flush()
+        started = time.monotonic()
+        incremental = from_height is None
+
+        with get_db() as db:
+            cursor = db.cursor()
+            previous_hash = None
+            if incremental:
+                cursor.execute("SELECT height, hash FROM audit_checkpoint WHERE id=1")
+                row = cursor.fetchone()
+                from_height = row[0] + 1 if row else 1
+                previous_hash = row[1] if row else None
+            if previous_hash is None and from_height > 1:
+                cursor.execute("SELECT hash, block::text FROM audit_blocks WHERE height=%s", (from_height - 1,))
+                row = cursor.fetchone()
+                if row:
+                    previous_hash = row[0] or hashlib.sha256(row[1].encode()).hexdigest()
+
+            result = {
+                "valid": True,
+                "from_height": from_height,
+                "to_height": from_height - 1,
+                "blocks_checked": 0,
+            }
+            height = from_height - 1
+            last_hash = previous_hash
+
+            while True:
+                # block::text is the stored serialization, byte for byte
+                cursor.execute("""
+                    SELECT height, hash, block::text, data::text FROM audit_blocks
+                    WHERE height > %s AND (%s IS NULL OR height <= %s)
+                    ORDER BY height LIMIT %s
+                """, (height, to_height, to_height, page_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+
+                for row_height, stored_hash, text, data in rows:
+                    computed = hashlib.sha256(text.encode()).hexdigest()
+                    header = json.loads(text)
+                    reason = None
+                    if row_height != height + 1:
+                        reason = f"missing block {height + 1}"
+                    elif stored_hash and stored_hash != computed:
+                        reason = "block contents do not match stored hash"
+                    elif last_hash is not None and header.get('previous_hash') != last_hash:
+                        reason = "previous_hash does not link to prior block"
+                    elif 'merkle_root' in header and data is None:
+                        # Nulling the payload must not skip the Merkle check
+                        reason = "transactions missing for merkle_root"
+                    elif data is not None and merkle_root(json.loads(data)) != header.get('merkle_root'):
+                        reason = "transactions do not match merkle_root"
+
+                    if reason:
+                        result.update(valid=False, invalid_height=row_height, reason=reason)
+                        break
+                    height = row_height
+                    last_hash = computed
+                    result["blocks_checked"] += 1
+
+                if not result["valid"] or len(rows) < page_size:
+                    break
+
+            result["to_height"] = height
+            if incremental and result["valid"] and height >= from_height:
+                cursor.execute("""
+                    INSERT INTO audit_checkpoint (id, height, hash, verified_at)
+                    VALUES (1, %s, %s, NOW())
+                    ON CONFLICT (id) DO UPDATE SET
+                        height = EXCLUDED.height,
+                        hash = EXCLUDED.hash,
+                        verified_at = EXCLUDED.verified_at
+                """, (height, last_hash))
+                db.commit()
+            cursor.close()
+
+        result["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return result
+
+    def stats(self):
+        with self._cond:
+            buffered = len(self._buffer)
+        return {
+            "buffered": buffered,
+            "max_buffered": self.max_buffered,
+            "blocks_written": self.blocks_written,
+            "flushes": self.flushes,
+            "forked": self.forked,
+            "forked_blocks": self.forked_blocks,
+        }
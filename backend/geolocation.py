@@ -0,0 +1,232 @@
+import os
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import requests
+from database import get_db
+from offline_geo import OfflineGeoDB
+
+GEO_CACHE_SIZE = int(os.getenv("GEO_CACHE_SIZE", "10000"))
+GEO_CACHE_TTL = float(os.getenv("GEO_CACHE_TTL", "86400"))
+# Failed lookups are cached for a shorter time so a flaky API is retried soon
+GEO_CACHE_NEGATIVE_TTL = float(os.getenv("GEO_CACHE_NEGATIVE_TTL", "300"))
+# Share hits between workers through the geo_cache table
+GEO_CACHE_SHARED = os.getenv("GEO_CACHE_SHARED", "0") == "1"
+# Local IP-range database answered before any remote lookup
+GEOIP_DB_PATH = os.getenv("GEOIP_DB_PATH", "")
+# Address family of integer start_ip/end_ip in that file, rows can override it with an ip_version column
+GEOIP_DB_IP_VERSION = int(os.getenv("GEOIP_DB_IP_VERSION", "4"))
+# Set to 0 to never call ipapi.co, IPs missing from the local database become Unknown
+GEOIP_REMOTE_FALLBACK = os.getenv("GEOIP_REMOTE_FALLBACK", "1") == "1"
+
+def unknown_location(ip):
+    return {
+        "country": "Unknown",
+        "city": "Unknown",
+        "region": "Unknown",
+        "latitude": 0,
+        "longitude": 0,
+        "timezone": "Unknown",
+        "isp": "Unknown",
+        "ip": ip,
+        "postal": "Unknown"
+    }
+
+def lookup_remote(ip):
+    """Look up an IP with ipapi.co, returns None when the lookup fails"""
+    try:
+        # Use ipapi.co for exact location
+        geo = requests.get(f"https://ipapi.co/{ip}/json/", timeout=5).json()
+        if not geo.get('error'):
+            return {
+                "country": geo.get("country_name", "Unknown"),
+                "city": geo.get("city", "Unknown"),
+                "region": geo.get("region", "Unknown"),
+                "latitude": geo.get("latitude", 0),
+                "longitude": geo.get("longitude", 0),
+                "timezone": geo.get("timezone", "Unknown"),
+                "isp": geo.get("org", "Unknown"),
+                "ip": geo.get("ip", ip),
+                "postal": geo.get("postal", "Unknown")
+            }
+    except:
+        pass
+    return None
+
+class PostgresGeoStore:
+    """Shared backing store so every worker benefits from each other's lookups"""
+
+    def get(self, ip):
+        with get_db() as db:
+            cursor = db.cursor()
+            cursor.execute("""
+                SELECT data, negative, EXTRACT(EPOCH FROM expires_at - NOW())
+                FROM geo_cache WHERE ip=%s AND expires_at > NOW()
+            """, (ip,))
+            row = cursor.fetchone()
+            cursor.close()
+        if not row:
+            return None
+        data, negative, remaining = row
+        if isinstance(data, str):
+            data = json.loads(data)
+        return data, negative, float(remaining)
+
+    def put(self, ip, value, negative, ttl):
+        with get_db() as db:
+            cursor = db.cursor()
+            cursor.execute("""
+                INSERT INTO geo_cache (ip, data, negative, expires_at)
+                VALUES (%s, %s, %s, NOW() + %s * INTERVAL '1 second')
+                ON CONFLICT (ip) DO UPDATE SET
+                    data = EXCLUDED.data,
+                    negative = EXCLUDED.negative,
+                    expires_at = EXCLUDED.expires_at
+            """, (ip, json.dumps(value), negative, ttl))
+            db.commit()
+            cursor.close()
+
+class GeoCache:
+    """LRU + TTL cache keyed by IP with negative caching and one in-flight lookup per IP"""
+
+    def __init__(self, maxsize, ttl, negative_ttl, store=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.store = store
+        self._entries = OrderedDict()  # ip -> (expires_at, value, negative)
+        self._inflight = {}  # ip -> Future
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "shared_hits": 0,
+            "coalesced": 0,
+            "lookups": 0,
+            "failed_lookups": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    def _remember(self, ip, value, negative, ttl):
+        with self._lock:
+            self._entries[ip] = (time.monotonic() + ttl, value, negative)
+            self._entries.move_to_end(ip)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def get(self, ip, fetch):
+        with self._lock:
+            entry = self._entries.get(ip)
+            if entry:
+                expires_at, value, negative = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(ip)
+                    self._stats["negative_hits" if negative else "hits"] += 1
+                    return value
+                del self._entries[ip]
+                self._stats["expirations"] += 1
+
+            future = self._inflight.get(ip)
+            if future:
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                self._stats["misses"] += 1
+                future = self._inflight[ip] = Future()
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = self._load(ip, fetch)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(ip, None)
+
+    def _load(self, ip, fetch):
+        if self.store:
+            try:
+                shared = self.store.get(ip)
+            except Exception as e:
+                print(f"Geo cache store error: {e}")
+                shared = None
+            if shared:
+                value, negative, remaining = shared
+                with self._lock:
+                    self._stats["shared_hits"] += 1
+                self._remember(ip, value, negative, remaining)
+                return value
+
+        value = fetch(ip)
+        negative = value is None
+        with self._lock:
+            self._stats["lookups"] += 1
+            if negative:
+                self._stats["failed_lookups"] += 1
+        if negative:
+            value = unknown_location(ip)
+        ttl = self.negative_ttl if negative else self.ttl
+        self._remember(ip, value, negative, ttl)
+
+        if self.store:
+            try:
+                self.store.put(ip, value, negative, ttl)
+            except Exception as e:
+                print(f"Geo cache store error: {e}")
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            served = self._stats["hits"] + self._stats["negative_hits"] + self._stats["misses"] + self._stats["coalesced"]
+            cached = self._stats["hits"] + self._stats["negative_hits"] + self._stats["coalesced"]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "max_size": self.maxsize,
+                "hit_rate": round(cached / served, 3) if served else 0,
+                "shared": self.store is not None,
+            }
+
+geo_cache = GeoCache(
+    GEO_CACHE_SIZE,
+    GEO_CACHE_TTL,
+    GEO_CACHE_NEGATIVE_TTL,
+    store=PostgresGeoStore() if GEO_CACHE_SHARED else None,
+)
+
+def load_offline_db(path):
+    if not path:
+        return None
+    try:
+        db = OfflineGeoDB.load(path, GEOIP_DB_IP_VERSION)
+        print(f"Loaded {len(db)} IP ranges from {path}")
+        return db
+    except Exception as e:
+        print(f"Offline geolocation database error: {e}")
+        return None
+
+offline_geo = load_offline_db(GEOIP_DB_PATH)
+
+def get_geolocation(ip):
+    if offline_geo:
+        location = offline_geo.lookup(ip)
+        if location:
+            return location
+    if not GEOIP_REMOTE_FALLBACK:
+        return unknown_location(ip)
+    return geo_cache.get(ip, lookup_remote)
@@ -1,76 +1,124 @@
-import psycopg2
-import os
+from database import get_db
+from partitions import ensure_partitioned
+from rollup import create_rollups
+
+# Composite indexes for the per-user, time-windowed UEBA queries and the
+# partial indexes behind the failed-login and deletion signals
+LOG_INDEXES = [
+    ("idx_login_logs_user_time", "login_logs (user_id, login_time DESC) INCLUDE (success, ip_address)"),
+    ("idx_login_logs_failed", "login_logs (user_id, login_time DESC) WHERE success = false"),
+    ("idx_device_logs_user_seen", "device_logs (user_id, first_seen DESC)"),
+    ("idx_device_logs_untrusted", "device_logs (user_id) WHERE trusted = false"),
+    ("idx_file_access_user_time", "file_access_logs (user_id, access_time DESC)"),
+    ("idx_file_access_deletes", "file_access_logs (user_id, access_time DESC) WHERE action = 'DELETE'"),
+    ("idx_file_time", "file_access_logs (access_time)"),
+]
+
+def create_log_indexes(cursor):
+    # Blocks writes while building, on a large existing table run migrate_indexes.py first
+    for name, definition in LOG_INDEXES:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
 
 def init_database():
     try:
-        db_url = os.getenv("DATABASE_URL", "")
-        if db_url and not db_url.startswith("postgresql://"):
-            db_url = "postgresql://" + db_url
-        
-        conn = psycopg2.connect(db_url)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                role VARCHAR(10) DEFAULT 'user',
-                status VARCHAR(20) DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                approved_by VARCHAR(50),
-                approved_at TIMESTAMP
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS login_logs (
-                id SERIAL PRIMARY KEY,
-                user_id VARCHAR(50) NOT NULL,
-                login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                ip_address VARCHAR(45),
-                success BOOLEAN DEFAULT FALSE,
-                country VARCHAR(100) DEFAULT 'Unknown',
-                city VARCHAR(100) DEFAULT 'Unknown'
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS device_logs (
-                id SERIAL PRIMARY KEY,
-                user_id VARCHAR(50) NOT NULL,
-                device_id VARCHAR(255) UNIQUE,
-                mac_address VARCHAR(17),
-                os VARCHAR(50),
-                trusted BOOLEAN DEFAULT FALSE,
-                first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                wifi_ssid VARCHAR(100),
-                hostname VARCHAR(100),
-                ip_address VARCHAR(45)
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS file_access_logs (
-                id SERIAL PRIMARY KEY,
-                user_id VARCHAR(50) NOT NULL,
-                file_name VARCHAR(255) NOT NULL,
-                action VARCHAR(10) DEFAULT 'READ',
-                ip_address VARCHAR(45),
-                access_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        cursor.execute("""
-            INSERT INTO users (username, password, role, status) VALUES 
-            ('admin', 'admin123', 'admin', 'active'),
-            ('bhargav', 'admin123', 'user', 'active')
-            ON CONFLICT (username) DO UPDATE SET status='active'
-        """)
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id SERIAL PRIMARY KEY,
+                    username VARCHAR(50) UNIQUE NOT NULL,
+                    password VARCHAR(255) NOT NULL,
+                    role VARCHAR(10) DEFAULT 'user',
+                    status VARCHAR(20) DEFAULT 'pending',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    approved_by VARCHAR(50),
+                    approved_at TIMESTAMP
+                )
+            """)
+            
+            ensure_partitioned(cursor, "login_logs")
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS device_logs (
+                    id SERIAL PRIMARY KEY,
+                    user_id VARCHAR(50) NOT NULL,
+                    device_id VARCHAR(255) UNIQUE,
+                    mac_address VARCHAR(17),
+                    os VARCHAR(50),
+                    trusted BOOLEAN DEFAULT FALSE,
+                    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    wifi_ssid VARCHAR(100),
+                    hostname VARCHAR(100),
+                    ip_address VARCHAR(45)
+                )
+            """)
+            
+            ensure_partitioned(cursor, "file_access_logs")
+            
+            create_log_indexes(cursor)
+            create_rollups(cursor)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS audit_blocks (
+                    height BIGINT PRIMARY KEY,
+                    hash VARCHAR(64),
+                    block JSON NOT NULL,
+                    data JSON,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # Databases created before hash/data were split out of the block JSON
+            cursor.execute("ALTER TABLE audit_blocks ADD COLUMN IF NOT EXISTS hash VARCHAR(64)")
+            cursor.execute("ALTER TABLE audit_blocks ADD COLUMN IF NOT EXISTS data JSON")
+            
+            # Blocks that lost a height conflict to another writer, kept for inspection
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS audit_forks (
+                    id SERIAL PRIMARY KEY,
+                    height BIGINT NOT NULL,
+                    hash VARCHAR(64),
+                    block JSON NOT NULL,
+                    data JSON,
+                    detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS audit_transactions (
+                    tx_id VARCHAR(32) PRIMARY KEY,
+                    height BIGINT NOT NULL,
+                    position INTEGER NOT NULL
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS audit_checkpoint (
+                    id INTEGER PRIMARY KEY DEFAULT 1,
+                    height BIGINT NOT NULL,
+                    hash VARCHAR(64) NOT NULL,
+                    verified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS geo_cache (
+                    ip VARCHAR(45) PRIMARY KEY,
+                    data JSONB NOT NULL,
+                    negative BOOLEAN DEFAULT FALSE,
+                    expires_at TIMESTAMP NOT NULL
+                )
+            """)
+            
+            cursor.execute("""
+                INSERT INTO users (username, password, role, status) VALUES 
+                ('admin', 'admin123', 'admin', 'active'),
+                ('bhargav', 'admin123', 'user', 'active')
+                ON CONFLICT (username) DO UPDATE SET status='active'
+            """)
+            
+            conn.commit()
+            cursor.close()
         print("Database initialized successfully")
     except Exception as e:
         print(f"Database init error: {e}")
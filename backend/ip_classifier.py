@@ -0,0 +1,136 @@
+"""
+CIDR-based IP address classification.
+
+Addresses are converted to integers once and matched against a table of
+special-purpose ranges: RFC1918 private space, loopback, carrier grade
+NAT, link-local and IPv6 unique local addresses, plus corporate ranges
+from CORPORATE_NETWORKS. The table holds one dict of networks per prefix
+length and is probed longest prefix length first, so the longest matching
+prefix wins and a corporate range inside 10.0.0.0/8 is reported as
+corporate.
+
+This module has no dependencies outside the standard library and is
+shared with the agents: agent/ip_classifier.py is a byte-for-byte copy of
+this file, kept in sync by test_ip_classifier.py.
+"""
+
+import ipaddress
+import os
+import socket
+
+# Comma separated CIDRs of the organisation's own networks, e.g. "203.0.113.0/24"
+CORPORATE_NETWORKS = [cidr.strip() for cidr in os.getenv("CORPORATE_NETWORKS", "").split(",") if cidr.strip()]
+
+SPECIAL_NETWORKS = {
+    "private": ["10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16"],
+    "loopback": ["127.0.0.0/8", "::1/128"],
+    "cgnat": ["100.64.0.0/10"],
+    "link_local": ["169.254.0.0/16", "fe80::/10"],
+    "ula": ["fc00::/7"],
+}
+
+EXTERNAL = "external"
+INVALID = "invalid"
+CORPORATE = "corporate"
+INTERNAL_CATEGORIES = frozenset(list(SPECIAL_NETWORKS) + [CORPORATE])
+
+_MAPPED_PREFIX = 0xFFFF << 32
+
+class PrefixTable:
+    """
+    Longest-prefix match over integer addresses.
+    Each family keeps a list of (prefix length, {prefix: value}) sorted
+    longest first; a lookup is one shift and one dict probe per distinct
+    prefix length until the first hit.
+    """
+
+    def __init__(self):
+        self._levels = {32: [], 128: []}
+
+    def insert(self, cidr, value):
+        network = ipaddress.ip_network(cidr, strict=False)
+        bits, length = network.max_prefixlen, network.prefixlen
+        levels = self._levels[bits]
+        for level_length, prefixes in levels:
+            if level_length == length:
+                break
+        else:
+            prefixes = {}
+            levels.append((length, prefixes))
+            levels.sort(key=lambda level: level[0], reverse=True)
+        prefixes[int(network.network_address) >> (bits - length)] = value
+
+    def lookup(self, bits, value):
+        for length, prefixes in self._levels[bits]:
+            match = prefixes.get(value >> (bits - length))
+            if match is not None:
+                return match
+        return None
+
+def ip_to_int(ip):
+    """(bits, integer) for an IPv4/IPv6 address string, None if it is not one"""
+    try:
+        return 32, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except (OSError, TypeError, ValueError):
+        pass
+    try:
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip.split("%", 1)[0]), "big")
+    except (OSError, AttributeError, TypeError, ValueError):
+        return None
+    # IPv4-mapped IPv6 (::ffff:a.b.c.d) is classified as the IPv4 address
+    if value >> 32 == 0xFFFF:
+        return 32, value ^ _MAPPED_PREFIX
+    return 128, value
+
+class _ClassCache(dict):
+    """ip -> category, filled on first lookup and cleared when full"""
+
+    def __init__(self, classify, size):
+        super().__init__()
+        self.classify = classify
+        self.size = size
+
+    def __missing__(self, ip):
+        if len(self) >= self.size:
+            self.clear()
+        category = self[ip] = self.classify(ip)
+        return category
+
+class IPClassifier:
+    def __init__(self, corporate=CORPORATE_NETWORKS, cache_size=65536):
+        self.prefixes = PrefixTable()
+        for category, networks in SPECIAL_NETWORKS.items():
+            for cidr in networks:
+                self.prefixes.insert(cidr, category)
+        for cidr in corporate:
+            self.prefixes.insert(cidr, CORPORATE)
+        # Plain dict lookups for repeated addresses
+        self.categories = _ClassCache(self._classify, cache_size)
+
+    def _classify(self, ip):
+        parsed = ip_to_int(ip)
+        if parsed is None:
+            return INVALID
+        return self.prefixes.lookup(*parsed) or EXTERNAL
+
+    def classify(self, ip):
+        """One of SPECIAL_NETWORKS' categories, "corporate", "external" or "invalid" """
+        return self.categories[ip]
+
+    def is_internal(self, ip):
+        return self.categories[ip] in INTERNAL_CATEGORIES
+
+    def is_external(self, ip):
+        return self.categories[ip] == EXTERNAL
+
+    def classify_many(self, ips):
+        """Categories for a batch of addresses, in order; each distinct address is classified once"""
+        categories = self.categories
+        return [categories[ip] for ip in ips]
+
+    def external(self, ips):
+        """Distinct external addresses in a batch"""
+        categories = self.categories
+        return {ip for ip in set(ips) if categories[ip] == EXTERNAL}
+
+classifier = IPClassifier()
@@ -0,0 +1,284 @@
+"""
+Write-behind buffer for the event log tables.
+
+Endpoints hand their login/device/file rows to `log_writer.write()` and
+return without waiting for a commit. A background task flushes the
+buffered rows in bulk (COPY for the append-only logs, one upsert batch for
+devices) in a single transaction once LOG_FLUSH_SIZE rows are pending or
+LOG_FLUSH_INTERVAL seconds have passed.
+
+When LOG_QUEUE_MAX rows are pending, writers wait up to LOG_WRITE_TIMEOUT
+seconds for the next flush (backpressure) and then fail with LogWriterFull,
+which endpoints turn into a 503. With LOG_SPILL_PATH set, rows that cannot
+be written in time are appended to that file as JSON lines instead, and
+replayed once the database accepts writes again.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime
+from database import get_async_db, run_blocking
+
+LOG_WRITE_BEHIND = os.getenv("LOG_WRITE_BEHIND", "1") == "1"
+LOG_FLUSH_SIZE = int(os.getenv("LOG_FLUSH_SIZE", "500"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1"))
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "50000"))
+LOG_SPILL_PATH = os.getenv("LOG_SPILL_PATH", "")
+LOG_WRITE_TIMEOUT = float(os.getenv("LOG_WRITE_TIMEOUT", "5"))
+
+# Row layout per table, rows are tuples in this column order
+LOG_TABLES = {
+    "login_logs": ("user_id", "login_time", "ip_address", "success", "country", "city"),
+    "device_logs": ("user_id", "device_id", "mac_address", "os", "wifi_ssid", "hostname",
+                    "ip_address", "trusted", "first_seen"),
+    "file_access_logs": ("user_id", "file_name", "action", "ip_address", "access_time"),
+}
+TIME_COLUMNS = {"login_time", "first_seen", "access_time"}
+REQUIRED_COLUMNS = {"user_id", "file_name"}
+# VARCHAR limits from init_db, checked up front so one bad row cannot fail a whole batch
+COLUMN_LIMITS = {
+    "user_id": 50, "ip_address": 45, "country": 100, "city": 100, "device_id": 255,
+    "mac_address": 17, "os": 50, "wifi_ssid": 100, "hostname": 100, "file_name": 255, "action": 10,
+}
+
+DEVICE_UPSERT_SQL = """
+    INSERT INTO device_logs (user_id, device_id, mac_address, os, wifi_ssid, hostname, ip_address, trusted, first_seen)
+    VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9)
+    ON CONFLICT (device_id) DO UPDATE SET
+        ip_address = EXCLUDED.ip_address,
+        wifi_ssid = EXCLUDED.wifi_ssid,
+        first_seen = EXCLUDED.first_seen
+"""
+
+async def insert_rows(batches):
+    """Write {table: [rows]} in one transaction"""
+    async with get_async_db() as db:
+        async with db.transaction():
+            for table, rows in batches.items():
+                if not rows:
+                    continue
+                if table == "device_logs":
+                    # Only the last registration of a device in the batch matters
+                    latest = {row[1]: row for row in rows if row[1] is not None}
+                    rows = [row for row in rows if row[1] is None] + list(latest.values())
+                    await db.executemany(DEVICE_UPSERT_SQL, rows)
+                else:
+                    await db.copy_records_to_table(table, records=rows, columns=LOG_TABLES[table])
+
+class LogWriterFull(Exception):
+    """The queue stayed full for LOG_WRITE_TIMEOUT seconds and there is no spill file"""
+
+def validate_row(table, row):
+    for column, value in zip(LOG_TABLES[table], row):
+        if value is None and column in REQUIRED_COLUMNS:
+            raise ValueError(f"{table}.{column} is required")
+        limit = COLUMN_LIMITS.get(column)
+        if limit and isinstance(value, str) and len(value) > limit:
+            raise ValueError(f"{table}.{column} is longer than {limit} characters")
+
+def _encode(table, row):
+    return json.dumps({
+        "table": table,
+        "row": [value.isoformat() if isinstance(value, datetime) else value for value in row],
+    })
+
+def _decode(line):
+    record = json.loads(line)
+    table = record["table"]
+    row = tuple(
+        datetime.fromisoformat(value) if column in TIME_COLUMNS and value else value
+        for column, value in zip(LOG_TABLES[table], record["row"])
+    )
+    return table, row
+
+class LogWriter:
+    """Buffers log rows in memory and flushes them in bulk from a background task"""
+
+    def __init__(self, enabled=LOG_WRITE_BEHIND, flush_size=LOG_FLUSH_SIZE,
+                 flush_interval=LOG_FLUSH_INTERVAL, max_pending=LOG_QUEUE_MAX, spill_path=LOG_SPILL_PATH,
+                 write_timeout=LOG_WRITE_TIMEOUT):
+        self.enabled = enabled
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.spill_path = spill_path
+        self.write_timeout = write_timeout
+        self._buffers = {table: [] for table in LOG_TABLES}
+        self._pending = 0
+        self._task = None
+        self._wakeup = None
+        self._room = None
+        self._flush_lock = None
+        self._spill_lock = threading.Lock()
+        # Called with {table: [rows]} after rows are committed
+        self.listeners = []
+        self.rows_written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.backpressure_waits = 0
+        self.backpressure_timeouts = 0
+        self.lost = 0
+
+    def _ensure_primitives(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+            self._room = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+
+    def start(self):
+        if self._task or not self.enabled:
+            return
+        self._ensure_primitives()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write out everything still buffered"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pending:
+            try:
+                await self.flush()
+            except Exception as e:
+                # flush() already spilled the rows if it could, otherwise they are gone
+                if not self.spill_path:
+                    self.lost += self._pending
+                    print(f"Log writer lost {self._pending} buffered rows on shutdown: {e}")
+                else:
+                    print(f"Log writer spilled buffered rows on shutdown: {e}")
+
+    async def write(self, table, row):
+        """Queue one row for `table`. Returns without waiting for a commit."""
+        validate_row(table, row)
+        if not self.enabled:
+            await insert_rows({table: [row]})
+            self.rows_written += 1
+            self._notify({table: [row]})
+            return
+        self._ensure_primitives()
+
+        while self._pending >= self.max_pending:
+            if self.spill_path:
+                await run_blocking(self._spill, [(table, row)])
+                return
+            self.backpressure_waits += 1
+            self._room.clear()
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._room.wait(), self.write_timeout)
+            except asyncio.TimeoutError:
+                self.backpressure_timeouts += 1
+                raise LogWriterFull(f"Log queue full for {self.write_timeout}s, database is not keeping up")
+
+        self._buffers[table].append(row)
+        self._pending += 1
+        if self._pending >= self.flush_size:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Log writer flush error: {e}")
+                await asyncio.sleep(self.flush_interval)
+
+    async def flush(self):
+        self._ensure_primitives()
+        async with self._flush_lock:
+            batches = {table: rows for table, rows in self._buffers.items() if rows}
+            count = sum(len(rows) for rows in batches.values())
+            if batches:
+                self._buffers = {table: [] for table in LOG_TABLES}
+                try:
+                    await insert_rows(batches)
+                except Exception:
+                    self.failed_flushes += 1
+                    if self.spill_path:
+                        await run_blocking(self._spill, [(t, row) for t, rows in batches.items() for row in rows])
+                        self._pending -= count
+                        self._room.set()
+                    else:
+                        # Keep the rows, ahead of anything written meanwhile
+                        for table, rows in batches.items():
+                            self._buffers[table][:0] = rows
+                    raise
+                self._pending -= count
+                self.rows_written += count
+                self.flushes += 1
+                self._room.set()
+                self._notify(batches)
+
+            if self.spill_path and (os.path.exists(self.spill_path) or os.path.exists(self._replay_path)):
+                await self._replay_spill()
+
+    @property
+    def _replay_path(self):
+        return self.spill_path + ".replay"
+
+    def _spill(self, rows):
+        with self._spill_lock:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for table, row in rows:
+                    f.write(_encode(table, row) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.spilled += len(rows)
+
+    def _take_spill(self):
+        # Rows spilled while a replay is running go to a fresh spill file
+        with self._spill_lock:
+            if not os.path.exists(self._replay_path):
+                os.replace(self.spill_path, self._replay_path)
+        batches = {table: [] for table in LOG_TABLES}
+        with open(self._replay_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    table, row = _decode(line)
+                    batches[table].append(row)
+        return batches
+
+    async def _replay_spill(self):
+        batches = await run_blocking(self._take_spill)
+        await insert_rows(batches)
+        os.remove(self._replay_path)
+        self.replayed += sum(len(rows) for rows in batches.values())
+        self._notify(batches)
+
+    def _notify(self, batches):
+        for listener in self.listeners:
+            try:
+                listener(batches)
+            except Exception as e:
+                print(f"Log writer listener error: {e}")
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "pending": self._pending,
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "backpressure_waits": self.backpressure_waits,
+            "backpressure_timeouts": self.backpressure_timeouts,
+            "lost": self.lost,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+        }
+
+log_writer = LogWriter()
@@ -1,25 +1,55 @@
 from fastapi import FastAPI, Request, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from datetime import datetime, time as dt_time
-import os
-import requests
-import hashlib
-import json
-
-def get_db():
-    import psycopg2
-    import psycopg2.extras
-    db_url = os.getenv("DATABASE_URL", "postgresql://localhost/zero")
-    if db_url and not db_url.startswith("postgresql://"):
-        db_url = "postgresql://" + db_url
-    return psycopg2.connect(db_url)
+from blockchain import Blockchain
+from chain_store import PostgresChainStore
+from database import get_db, get_async_db, pool, open_async_pool, close_async_pool, async_pool_stats, run_blocking
+from geolocation import get_geolocation, geo_cache
+from log_writer import log_writer, LogWriterFull
+from merkle import leaf_hash, merkle_proof
+from metrics import admin_overview, user_activity
+from risk_cache import risk_cache
+from partitions import partition_maintainer
+from sealer import BlockSealer, SEAL_BATCH_SIZE, SEAL_INTERVAL, SEAL_WORKERS
+from ueba_stream import ueba_engine, load_recent
+from telemetry import GzipRequestMiddleware, FILE_ACCESS_COLUMNS, parse_events, file_access_records
 
 app = FastAPI(title="Zero Trust Security Platform")
 
 @app.on_event("startup")
 async def startup_event():
     from init_db import init_database
-    init_database()
+    await run_blocking(init_database)
+    try:
+        await run_blocking(pool.warm_up)
+        await open_async_pool()
+    except Exception as e:
+        # Pools connect lazily on first use if the database is not up yet
+        print(f"Database pool warm-up error: {e}")
+    try:
+        await run_blocking(blockchain.restore)
+    except Exception as e:
+        # Sealing from the in-memory genesis would collide with the stored heights,
+        # the sealer holds its transactions and retries the restore instead
+        print(f"Audit chain restore error, sealing paused until it succeeds: {e}")
+    try:
+        await run_blocking(_load_ueba_state)
+    except Exception as e:
+        print(f"UEBA state load error: {e}")
+    blockchain.store.start()
+    sealer.start()
+    log_writer.start()
+    partition_maintainer.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await partition_maintainer.stop()
+    await log_writer.stop()
+    await sealer.stop()
+    await run_blocking(blockchain.store.stop)
+    await close_async_pool()
+    pool.closeall()
 
 app.add_middleware(
     CORSMiddleware,
@@ -28,157 +58,122 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(GzipRequestMiddleware)
 
-def get_geolocation(ip):
-    try:
-        # Use ipapi.co for exact location
-        geo = requests.get(f"https://ipapi.co/{ip}/json/", timeout=5).json()
-        if not geo.get('error'):
-            return {
-                "country": geo.get("country_name", "Unknown"),
-                "city": geo.get("city", "Unknown"),
-                "region": geo.get("region", "Unknown"),
-                "latitude": geo.get("latitude", 0),
-                "longitude": geo.get("longitude", 0),
-                "timezone": geo.get("timezone", "Unknown"),
-                "isp": geo.get("org", "Unknown"),
-                "ip": geo.get("ip", ip),
-                "postal": geo.get("postal", "Unknown")
-            }
-    except:
-        pass
-    return {
-        "country": "Unknown",
-        "city": "Unknown",
-        "region": "Unknown",
-        "latitude": 0,
-        "longitude": 0,
-        "timezone": "Unknown",
-        "isp": "Unknown",
-        "ip": ip,
-        "postal": "Unknown"
-    }
+def _load_ueba_state():
+    with get_db() as db:
+        count = load_recent(ueba_engine, db)
+    print(f"UEBA engine loaded {count} recent events")
 
 # Blockchain for audit trail
-class Blockchain:
-    def __init__(self):
-        self.chain = []
-        self.create_block(proof=1, previous_hash='0')
-    
-    def create_block(self, proof, previous_hash):
-        block = {
-            'index': len(self.chain) + 1,
-            'timestamp': str(datetime.now()),
-            'proof': proof,
-            'previous_hash': previous_hash,
-            'data': []
-        }
-        self.chain.append(block)
-        return block
-    
-    def add_transaction(self, transaction):
-        if self.chain:
-            self.chain[-1]['data'].append(transaction)
-    
-    def get_previous_block(self):
-        return self.chain[-1] if self.chain else None
-    
-    def proof_of_work(self, previous_proof):
-        new_proof = 1
-        while True:
-            hash_operation = hashlib.sha256(str(new_proof**2 - previous_proof**2).encode()).hexdigest()
-            if hash_operation[:4] == '0000':
-                return new_proof
-            new_proof += 1
-    
-    def hash(self, block):
-        encoded_block = json.dumps(block, sort_keys=True).encode()
-        return hashlib.sha256(encoded_block).hexdigest()
-
-blockchain = Blockchain()
+blockchain = Blockchain(store=PostgresChainStore())
+sealer = BlockSealer(blockchain, SEAL_BATCH_SIZE, SEAL_INTERVAL, SEAL_WORKERS)
 
 # UEBA Risk Scoring Engine
-def calculate_risk_score(username, db):
-    """Calculate risk score based on UEBA signals"""
+RISK_SIGNALS_SQL = """
+    WITH u AS (
+        SELECT DISTINCT unnest(%s::varchar[]) AS user_id
+    ),
+    l AS (
+        SELECT user_id,
+            COUNT(*) FILTER (
+                WHERE (EXTRACT(HOUR FROM login_time) < 8 OR EXTRACT(HOUR FROM login_time) > 18)
+                AND login_time > NOW() - INTERVAL '24 hours'
+            ) AS odd_hours,
+            COUNT(*) FILTER (
+                WHERE success=false AND login_time > NOW() - INTERVAL '1 hour'
+            ) AS failed,
+            COUNT(DISTINCT ip_address) FILTER (
+                WHERE login_time > NOW() - INTERVAL '1 hour'
+            ) AS ips,
+            COUNT(*) FILTER (
+                WHERE EXTRACT(DOW FROM login_time) IN (0,6)
+            ) AS weekend
+        FROM login_logs
+        WHERE user_id IN (SELECT user_id FROM u)
+        AND login_time > NOW() - INTERVAL '7 days'
+        GROUP BY user_id
+    ),
+    d AS (
+        SELECT user_id, COUNT(*) AS untrusted FROM device_logs
+        WHERE user_id IN (SELECT user_id FROM u) AND trusted=false
+        GROUP BY user_id
+    ),
+    f AS (
+        SELECT user_id,
+            COUNT(*) AS files,
+            COUNT(*) FILTER (WHERE action='DELETE') AS deletions
+        FROM file_access_logs
+        WHERE user_id IN (SELECT user_id FROM u)
+        AND access_time > NOW() - INTERVAL '24 hours'
+        GROUP BY user_id
+    )
+    SELECT u.user_id,
+        COALESCE(l.odd_hours, 0) AS odd_hours,
+        COALESCE(l.failed, 0) AS failed,
+        COALESCE(l.ips, 0) AS ips,
+        COALESCE(l.weekend, 0) AS weekend,
+        COALESCE(d.untrusted, 0) AS untrusted,
+        COALESCE(f.files, 0) AS files,
+        COALESCE(f.deletions, 0) AS deletions
+    FROM u
+    LEFT JOIN l ON l.user_id = u.user_id
+    LEFT JOIN d ON d.user_id = u.user_id
+    LEFT JOIN f ON f.user_id = u.user_id
+"""
+
+NO_RISK_SIGNALS = {
+    "odd_hours": 0, "failed": 0, "ips": 0, "weekend": 0,
+    "untrusted": 0, "files": 0, "deletions": 0
+}
+
+def score_risk_signals(counts):
+    """Turn the raw UEBA signal counts for one user into a risk decision"""
     risk_score = 0
     signals = []
     
-    cursor = db.cursor(cursor_factory=__import__('psycopg2.extras', fromlist=['RealDictCursor']).RealDictCursor)
-    
-    # 1. Check odd-hour logins (outside 8 AM - 6 PM)
-    cursor.execute("""
-        SELECT COUNT(*) as count FROM login_logs 
-        WHERE user_id=%s AND (EXTRACT(HOUR FROM login_time) < 8 OR EXTRACT(HOUR FROM login_time) > 18)
-        AND login_time > NOW() - INTERVAL '24 hours'
-    """, (username,))
-    odd_hours = cursor.fetchone()['count']
+    # 1. Odd-hour logins (outside 8 AM - 6 PM, last 24 hours)
+    odd_hours = counts["odd_hours"]
     if odd_hours > 0:
         risk_score += odd_hours * 5
         signals.append(f"ODD_HOUR_LOGIN ({odd_hours} times)")
     
-    # 2. Check failed login attempts
-    cursor.execute("""
-        SELECT COUNT(*) as count FROM login_logs 
-        WHERE user_id=%s AND success=false AND login_time > NOW() - INTERVAL '1 hour'
-    """, (username,))
-    failed = cursor.fetchone()['count']
+    # 2. Failed login attempts (last hour)
+    failed = counts["failed"]
     if failed > 3:
         risk_score += 15
         signals.append(f"FAILED_LOGIN_ATTEMPTS ({failed})")
     
-    # 3. Check multiple IPs
-    cursor.execute("""
-        SELECT COUNT(DISTINCT ip_address) as count FROM login_logs 
-        WHERE user_id=%s AND login_time > NOW() - INTERVAL '1 hour'
-    """, (username,))
-    ips = cursor.fetchone()['count']
+    # 3. Multiple IPs (last hour)
+    ips = counts["ips"]
     if ips > 2:
         risk_score += 10
         signals.append(f"MULTIPLE_IPS ({ips})")
     
-    # 4. Check weekend access
-    cursor.execute("""
-        SELECT COUNT(*) as count FROM login_logs 
-        WHERE user_id=%s AND EXTRACT(DOW FROM login_time) IN (0,6)
-        AND login_time > NOW() - INTERVAL '7 days'
-    """, (username,))
-    weekend = cursor.fetchone()['count']
+    # 4. Weekend access (last 7 days)
+    weekend = counts["weekend"]
     if weekend > 0:
         risk_score += weekend * 3
         signals.append(f"WEEKEND_ACCESS ({weekend} times)")
     
-    # 5. Check unknown devices
-    cursor.execute("""
-        SELECT COUNT(*) as count FROM device_logs 
-        WHERE user_id=%s AND trusted=false
-    """, (username,))
-    untrusted = cursor.fetchone()['count']
+    # 5. Unknown devices
+    untrusted = counts["untrusted"]
     if untrusted > 0:
         risk_score += untrusted * 10
         signals.append(f"UNTRUSTED_DEVICES ({untrusted})")
     
-    # 6. Check sensitive file access
-    cursor.execute("""
-        SELECT COUNT(*) as count FROM file_access_logs 
-        WHERE user_id=%s AND access_time > NOW() - INTERVAL '24 hours'
-    """, (username,))
-    files = cursor.fetchone()['count']
+    # 6. Sensitive file access (last 24 hours)
+    files = counts["files"]
     if files > 50:
         risk_score += 15
         signals.append(f"EXCESSIVE_FILE_ACCESS ({files})")
     
-    # 7. Check file deletions
-    cursor.execute("""
-        SELECT COUNT(*) as count FROM file_access_logs 
-        WHERE user_id=%s AND action='DELETE' AND access_time > NOW() - INTERVAL '24 hours'
-    """, (username,))
-    deletions = cursor.fetchone()['count']
+    # 7. File deletions (last 24 hours)
+    deletions = counts["deletions"]
     if deletions > 5:
         risk_score += 20
         signals.append(f"FILE_DELETIONS ({deletions})")
     
-    cursor.close()
-    
     # Cap at 100
     risk_score = min(risk_score, 100)
     
@@ -208,66 +203,81 @@ def calculate_risk_score(username, db):
         "signals": signals
     }
 
+def calculate_risk_scores(usernames, db):
+    """Score many users at once with a single grouped query over the log tables"""
+    usernames = [u for u in usernames if u]
+    if not usernames:
+        return {}
+    
+    cursor = db.cursor(cursor_factory=__import__('psycopg2.extras', fromlist=['RealDictCursor']).RealDictCursor)
+    cursor.execute(RISK_SIGNALS_SQL, (usernames,))
+    rows = cursor.fetchall()
+    cursor.close()
+    
+    return {row["user_id"]: score_risk_signals(row) for row in rows}
+
+def calculate_risk_score(username, db):
+    """Calculate risk score based on UEBA signals"""
+    scores = calculate_risk_scores([username], db)
+    return scores.get(username) or score_risk_signals(NO_RISK_SIGNALS)
+
 @app.post("/auth/register")
 async def register(request: Request, username: str = Form(...), password: str = Form(...)):
     try:
-        db = get_db()
-        cursor = db.cursor()
-        
-        cursor.execute("SELECT * FROM users WHERE username=%s", (username,))
-        if cursor.fetchone():
-            cursor.close()
-            db.close()
-            return {"status": "FAIL", "message": "Username already exists"}
-        
-        cursor.execute("""
-            INSERT INTO users (username, password, role, status)
-            VALUES (%s, %s, 'user', 'pending')
-        """, (username, password))
-        db.commit()
-        cursor.close()
-        db.close()
+        async with get_async_db() as db:
+            if await db.fetchrow("SELECT 1 FROM users WHERE username=$1", username):
+                return {"status": "FAIL", "message": "Username already exists"}
+            
+            await db.execute("""
+                INSERT INTO users (username, password, role, status)
+                VALUES ($1, $2, 'user', 'pending')
+            """, username, password)
         
         return {"status": "SUCCESS", "message": "Registration pending admin approval"}
     except Exception as e:
         return {"status": "FAIL", "error": str(e)}
 
+def _compute_risk_score(username):
+    with get_db() as db:
+        return calculate_risk_score(username, db)
+
+def _risk_score_for(username):
+    return risk_cache.get(username, _compute_risk_score)
+
+def _invalidate_flushed(batches):
+    # Scores computed before the rows were committed did not see them
+    risk_cache.invalidate(*{row[0] for rows in batches.values() for row in rows})
+
+log_writer.listeners.append(_invalidate_flushed)
+
 @app.post("/auth/login")
 async def login(request: Request, username: str = Form(...), password: str = Form(...)):
     try:
-        db = get_db()
-        cursor = db.cursor(cursor_factory=__import__('psycopg2.extras', fromlist=['RealDictCursor']).RealDictCursor)
-        
-        cursor.execute("SELECT * FROM users WHERE username=%s AND password=%s", (username, password))
-        user = cursor.fetchone()
+        async with get_async_db() as db:
+            user = await db.fetchrow("SELECT * FROM users WHERE username=$1 AND password=$2", username, password)
         
         if not user:
-            cursor.close()
-            db.close()
             return {"status": "FAIL", "message": "Invalid credentials"}
         
         if user["status"] == "pending":
-            cursor.close()
-            db.close()
             return {"status": "FAIL", "message": "Account pending admin approval"}
         
         if user["status"] == "revoked":
-            cursor.close()
-            db.close()
             return {"status": "FAIL", "message": "Access revoked by admin"}
         
         success = True
         ip = request.client.host if request.client else "Unknown"
         
-        geo = get_geolocation(ip)
+        geo = await run_blocking(get_geolocation, ip)
         
-        cursor.execute("""
-            INSERT INTO login_logs (user_id, login_time, ip_address, success, country, city)
-            VALUES (%s, NOW(), %s, %s, %s, %s)
-        """, (username, geo["ip"], success, geo["country"], geo["city"]))
-        db.commit()
+        login_time = datetime.now()
+        await log_writer.write("login_logs", (
+            username, login_time, geo["ip"], success, geo["country"], geo["city"]
+        ))
+        ueba_engine.observe_login(username, login_time, geo["ip"], success, geo["country"])
+        risk_cache.invalidate(username)
         
-        blockchain.add_transaction({
+        audit_id = sealer.submit({
             "type": "LOGIN",
             "user": username,
             "success": success,
@@ -278,17 +288,7 @@ async def login(request: Request, username: str = Form(...), password: str = For
             "timestamp": str(datetime.now())
         })
         
-        if len(blockchain.chain[-1]['data']) >= 3:
-            previous_block = blockchain.get_previous_block()
-            previous_proof = previous_block['proof']
-            proof = blockchain.proof_of_work(previous_proof)
-            previous_hash = blockchain.hash(previous_block)
-            blockchain.create_block(proof, previous_hash)
-        
-        risk_data = calculate_risk_score(username, db)
-        
-        cursor.close()
-        db.close()
+        risk_data = await run_blocking(_risk_score_for, username)
         
         return {
             "status": "SUCCESS",
@@ -302,35 +302,29 @@ async def login(request: Request, username: str = Form(...), password: str = For
             "risk_score": risk_data["risk_score"],
             "risk_level": risk_data["risk_level"],
             "decision": risk_data["decision"],
-            "access_zone": risk_data["zone"]
+            "access_zone": risk_data["zone"],
+            "audit_id": audit_id
         }
+    except LogWriterFull as e:
+        return JSONResponse(status_code=503, content={"status": "FAIL", "error": str(e)}, headers={"Retry-After": "5"})
     except Exception as e:
         return {"status": "FAIL", "error": str(e)}
 
 @app.post("/admin/approve-user")
 async def approve_user(username: str = Form(...), admin: str = Form(...), action: str = Form(...)):
     try:
-        db = get_db()
-        cursor = db.cursor()
-        
-        cursor.execute("SELECT role FROM users WHERE username=%s", (admin,))
-        admin_user = cursor.fetchone()
-        if not admin_user or admin_user[0] != 'admin':
-            cursor.close()
-            db.close()
-            return {"status": "FAIL", "message": "Unauthorized"}
-        
-        if action == "approve":
-            cursor.execute("""
-                UPDATE users SET status='active', approved_by=%s, approved_at=NOW()
-                WHERE username=%s
-            """, (admin, username))
-        else:
-            cursor.execute("DELETE FROM users WHERE username=%s AND status='pending'", (username,))
-        
-        db.commit()
-        cursor.close()
-        db.close()
+        async with get_async_db() as db:
+            admin_user = await db.fetchrow("SELECT role FROM users WHERE username=$1", admin)
+            if not admin_user or admin_user["role"] != 'admin':
+                return {"status": "FAIL", "message": "Unauthorized"}
+            
+            if action == "approve":
+                await db.execute("""
+                    UPDATE users SET status='active', approved_by=$1, approved_at=NOW()
+                    WHERE username=$2
+                """, admin, username)
+            else:
+                await db.execute("DELETE FROM users WHERE username=$1 AND status='pending'", username)
         
         return {"status": "SUCCESS", "message": f"User {action}d successfully"}
     except Exception as e:
@@ -339,25 +333,15 @@ async def approve_user(username: str = Form(...), admin: str = Form(...), action
 @app.post("/admin/revoke-access")
 async def revoke_access(username: str = Form(...), admin: str = Form(...)):
     try:
-        db = get_db()
-        cursor = db.cursor()
-        
-        cursor.execute("SELECT role FROM users WHERE username=%s", (admin,))
-        admin_user = cursor.fetchone()
-        if not admin_user or admin_user[0] != 'admin':
-            cursor.close()
-            db.close()
-            return {"status": "FAIL", "message": "Unauthorized"}
-        
-        if username in ['admin', 'bhargav']:
-            cursor.close()
-            db.close()
-            return {"status": "FAIL", "message": "Cannot revoke protected users"}
-        
-        cursor.execute("UPDATE users SET status='revoked' WHERE username=%s", (username,))
-        db.commit()
-        cursor.close()
-        db.close()
+        async with get_async_db() as db:
+            admin_user = await db.fetchrow("SELECT role FROM users WHERE username=$1", admin)
+            if not admin_user or admin_user["role"] != 'admin':
+                return {"status": "FAIL", "message": "Unauthorized"}
+            
+            if username in ['admin', 'bhargav']:
+                return {"status": "FAIL", "message": "Cannot revoke protected users"}
+            
+            await db.execute("UPDATE users SET status='revoked' WHERE username=$1", username)
         
         return {"status": "SUCCESS", "message": "Access revoked"}
     except Exception as e:
@@ -366,15 +350,14 @@ async def revoke_access(username: str = Form(...), admin: str = Form(...)):
 @app.get("/admin/pending-users")
 def get_pending_users():
     try:
-        db = get_db()
-        cursor = db.cursor(cursor_factory=__import__('psycopg2.extras', fromlist=['RealDictCursor']).RealDictCursor)
-        cursor.execute("""
-            SELECT username, created_at FROM users WHERE status='pending' ORDER BY created_at DESC
-        """)
-        users = cursor.fetchall()
-        cursor.close()
-        db.close()
-        return [{"username": u["username"], "created_at": str(u["created_at"])} for u in users]
+        with get_db() as db:
+            cursor = db.cursor(cursor_factory=__import__('psycopg2.extras', fromlist=['RealDictCursor']).RealDictCursor)
+            cursor.execute("""
+                SELECT username, created_at FROM users WHERE status='pending' ORDER BY created_at DESC
+            """)
+            users = cursor.fetchall()
+            cursor.close()
+            return [{"username": u["username"], "created_at": str(u["created_at"])} for u in users]
     except:
         return []
 
@@ -382,96 +365,107 @@ def get_pending_users():
 def health_check():
     return {"status": "healthy", "service": "Zero Trust Platform"}
 
+@app.get("/metrics")
+def runtime_metrics():
+    """Runtime metrics for the backend's shared resources"""
+    return {
+        "db_pool": pool.stats(),
+        "db_async_pool": async_pool_stats(),
+        "geo_cache": geo_cache.stats(),
+        "block_sealer": sealer.stats(),
+        "chain_store": blockchain.store.stats(),
+        "log_writer": log_writer.stats(),
+        "log_partitions": partition_maintainer.stats(),
+        "ueba_engine": ueba_engine.stats(),
+        "risk_cache": risk_cache.stats()
+    }
+
 @app.get("/security/analyze/admin")
 def admin_view():
     try:
-        db = get_db()
-        cursor = db.cursor(cursor_factory=__import__('psycopg2.extras', fromlist=['RealDictCursor']).RealDictCursor)
-        cursor.execute("""
-            SELECT DISTINCT l.user_id,
-            (SELECT COUNT(*) FROM login_logs WHERE user_id=l.user_id) as total_logins,
-            (SELECT MAX(login_time) FROM login_logs WHERE user_id=l.user_id) as last_login,
-            (SELECT ip_address FROM login_logs WHERE user_id=l.user_id ORDER BY login_time DESC LIMIT 1) as ip_address,
-            (SELECT country FROM login_logs WHERE user_id=l.user_id ORDER BY login_time DESC LIMIT 1) as country,
-            (SELECT city FROM login_logs WHERE user_id=l.user_id ORDER BY login_time DESC LIMIT 1) as city,
-            (SELECT mac_address FROM device_logs WHERE user_id=l.user_id ORDER BY first_seen DESC LIMIT 1) as mac_address,
-            (SELECT wifi_ssid FROM device_logs WHERE user_id=l.user_id ORDER BY first_seen DESC LIMIT 1) as wifi_ssid,
-            (SELECT hostname FROM device_logs WHERE user_id=l.user_id ORDER BY first_seen DESC LIMIT 1) as hostname,
-            (SELECT os FROM device_logs WHERE user_id=l.user_id ORDER BY first_seen DESC LIMIT 1) as os,
-            (SELECT status FROM users WHERE username=l.user_id) as status
-            FROM login_logs l
-        """)
-        users = cursor.fetchall()
-        
-        result = []
-        for u in users:
-            risk_data = calculate_risk_score(u["user_id"], db)
+        with get_db() as db:
+            cursor = db.cursor(cursor_factory=__import__('psycopg2.extras', fromlist=['RealDictCursor']).RealDictCursor)
+            users = admin_overview(cursor)
+            risk_scores = risk_cache.get_many(
+                [u["user_id"] for u in users if u["user_id"]],
+                lambda missing: calculate_risk_scores(missing, db)
+            )
             
-            result.append({
-                "user": u["user_id"] or "unknown",
-                "risk_score": risk_data["risk_score"],
-                "risk_level": risk_data["risk_level"],
-                "decision": risk_data["decision"],
-                "access_zone": risk_data["zone"],
-                "total_logins": u["total_logins"] or 0,
-                "last_login": str(u["last_login"]) if u["last_login"] else None,
-                "signals": risk_data["signals"],
-                "ip_address": u["ip_address"] or "N/A",
-                "country": u["country"] or "Unknown",
-                "city": u["city"] or "Unknown",
-                "mac_address": u["mac_address"] or "N/A",
-                "wifi_ssid": u["wifi_ssid"] or "N/A",
-                "hostname": u["hostname"] or "N/A",
-                "os": u["os"] or "N/A",
-                "status": u["status"] or "active"
-            })
-        
-        cursor.close()
-        db.close()
-        return result
+            result = []
+            for u in users:
+                risk_data = risk_scores.get(u["user_id"]) or score_risk_signals(NO_RISK_SIGNALS)
+                
+                result.append({
+                    "user": u["user_id"] or "unknown",
+                    "risk_score": risk_data["risk_score"],
+                    "risk_level": risk_data["risk_level"],
+                    "decision": risk_data["decision"],
+                    "access_zone": risk_data["zone"],
+                    "total_logins": u["total_logins"] or 0,
+                    "logins_24h": u["logins_24h"] or 0,
+                    "logins_1h": u["logins_1h"] or 0,
+                    "last_login": str(u["last_login"]) if u["last_login"] else None,
+                    "signals": risk_data["signals"],
+                    "ip_address": u["ip_address"] or "N/A",
+                    "country": u["country"] or "Unknown",
+                    "city": u["city"] or "Unknown",
+                    "mac_address": u["mac_address"] or "N/A",
+                    "wifi_ssid": u["wifi_ssid"] or "N/A",
+                    "hostname": u["hostname"] or "N/A",
+                    "os": u["os"] or "N/A",
+                    "status": u["status"] or "active"
+                })
+            
+            cursor.close()
+            return result
     except Exception as e:
         print(f"Admin view error: {e}")
         import traceback
         traceback.print_exc()
         return []
 
+@app.get("/security/ueba/{username}")
+def ueba_signals(username: str):
+    """Behaviour signals for a user over the streaming engine's sliding window"""
+    return {
+        "user": username,
+        "signals": ueba_engine.signals(username),
+        "window_seconds": ueba_engine.window
+    }
+
 @app.get("/security/analyze/user/{username}")
 def user_view(username: str):
     try:
-        db = get_db()
-        cursor = db.cursor(cursor_factory=__import__('psycopg2.extras', fromlist=['RealDictCursor']).RealDictCursor)
-        
-        cursor.execute("SELECT COUNT(*) as total FROM login_logs WHERE user_id=%s", (username,))
-        total = cursor.fetchone()["total"]
-        
-        cursor.execute("SELECT * FROM login_logs WHERE user_id=%s ORDER BY login_time DESC LIMIT 1", (username,))
-        last_login = cursor.fetchone()
-        
-        cursor.execute("SELECT * FROM device_logs WHERE user_id=%s ORDER BY first_seen DESC LIMIT 1", (username,))
-        device = cursor.fetchone()
-        
-        risk_data = calculate_risk_score(username, db)
-        
-        cursor.close()
-        db.close()
-        
-        return {
-            "user": username,
-            "risk_score": risk_data["risk_score"],
-            "risk_level": risk_data["risk_level"],
-            "decision": risk_data["decision"],
-            "signals": risk_data["signals"],
-            "total_logins": total,
-            "last_login": str(last_login["login_time"]) if last_login else None,
-            "accessible_resources": ["dashboard", "profile", "reports", "analytics"],
-            "ip_address": last_login["ip_address"] if last_login else "N/A",
-            "mac_address": device["mac_address"] if device else "N/A",
-            "wifi_ssid": device["wifi_ssid"] if device else "N/A",
-            "hostname": device["hostname"] if device else "N/A",
-            "os": device["os"] if device else "N/A",
-            "country": last_login["country"] if last_login else "Unknown",
-            "city": last_login["city"] if last_login else "Unknown"
-        }
+        with get_db() as db:
+            cursor = db.cursor(cursor_factory=__import__('psycopg2.extras', fromlist=['RealDictCursor']).RealDictCursor)
+            
+            activity = user_activity(cursor, username)
+            last_login = activity if activity and activity["last_login"] else None
+            device = activity if activity and activity["last_device_seen"] else None
+            
+            risk_data = risk_cache.get(username, lambda u: calculate_risk_score(u, db))
+            
+            cursor.close()
+            
+            return {
+                "user": username,
+                "risk_score": risk_data["risk_score"],
+                "risk_level": risk_data["risk_level"],
+                "decision": risk_data["decision"],
+                "signals": risk_data["signals"],
+                "total_logins": activity["total_logins"] if activity else 0,
+                "logins_24h": activity["logins_24h"] if activity else 0,
+                "logins_1h": activity["logins_1h"] if activity else 0,
+                "last_login": str(last_login["last_login"]) if last_login else None,
+                "accessible_resources": ["dashboard", "profile", "reports", "analytics"],
+                "ip_address": last_login["last_ip"] if last_login else "N/A",
+                "mac_address": device["last_mac"] if device else "N/A",
+                "wifi_ssid": device["last_wifi_ssid"] if device else "N/A",
+                "hostname": device["last_hostname"] if device else "N/A",
+                "os": device["last_os"] if device else "N/A",
+                "country": last_login["last_country"] if last_login else "Unknown",
+                "city": last_login["last_city"] if last_login else "Unknown"
+            }
     except Exception as e:
         print(f"User view error: {e}")
         return {
@@ -498,43 +492,36 @@ async def register_device(request: Request):
         data = await request.json()
         ip = request.client.host if request.client else data.get("ip_address", "Unknown")
         
-        geo = get_geolocation(ip)
-        
-        db = get_db()
-        cursor = db.cursor()
+        geo = await run_blocking(get_geolocation, ip)
         
-        cursor.execute("""
-            INSERT INTO device_logs (user_id, device_id, mac_address, os, wifi_ssid, hostname, ip_address, trusted, first_seen)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s, NOW())
-            ON CONFLICT (device_id) DO UPDATE SET
-                ip_address = EXCLUDED.ip_address,
-                wifi_ssid = EXCLUDED.wifi_ssid,
-                first_seen = NOW()
-        """, (data.get("username"), data.get("device_id"), data.get("mac_address"), 
-              data.get("os"), data.get("wifi_ssid"), data.get("hostname"), 
-              geo["ip"], False))
-        db.commit()
-        cursor.close()
-        db.close()
+        seen = datetime.now()
+        await log_writer.write("device_logs", (
+            data.get("username"), data.get("device_id"), data.get("mac_address"),
+            data.get("os"), data.get("wifi_ssid"), data.get("hostname"),
+            geo["ip"], False, seen
+        ))
+        ueba_engine.observe_device(data.get("username"), data.get("mac_address"), data.get("wifi_ssid"), False, seen)
+        risk_cache.invalidate(data.get("username"))
         
         return {
             "status": "SUCCESS",
             "location": f"{geo['city']}, {geo['country']}",
             "timezone": geo["timezone"]
         }
+    except LogWriterFull as e:
+        return JSONResponse(status_code=503, content={"status": "FAIL", "error": str(e)}, headers={"Retry-After": "5"})
     except Exception as e:
         return {"status": "FAIL", "error": str(e)}
 
 @app.get("/files/list/{username}")
 def list_files(username: str):
     try:
-        db = get_db()
-        cursor = db.cursor(cursor_factory=__import__('psycopg2.extras', fromlist=['RealDictCursor']).RealDictCursor)
-        cursor.execute("SELECT * FROM file_access_logs WHERE user_id=%s ORDER BY access_time DESC LIMIT 50", (username,))
-        files = cursor.fetchall()
-        cursor.close()
-        db.close()
-        return files
+        with get_db() as db:
+            cursor = db.cursor(cursor_factory=__import__('psycopg2.extras', fromlist=['RealDictCursor']).RealDictCursor)
+            cursor.execute("SELECT * FROM file_access_logs WHERE user_id=%s ORDER BY access_time DESC LIMIT 50", (username,))
+            files = cursor.fetchall()
+            cursor.close()
+            return files
     except:
         return []
 
@@ -542,48 +529,106 @@ def list_files(username: str):
 async def file_access(request: Request):
     try:
         data = await request.json()
-        db = get_db()
-        cursor = db.cursor()
         ip = request.client.host if request.client else "Unknown"
         
-        cursor.execute("""
-            INSERT INTO file_access_logs (user_id, file_name, action, ip_address, access_time)
-            VALUES (%s,%s,%s,%s, NOW())
-        """, (data.get("user_id"), data.get("file_name"), data.get("action"), ip))
-        db.commit()
-        cursor.close()
-        db.close()
-        return {"status": "SUCCESS", "timestamp": datetime.now().isoformat()}
+        access_time = datetime.now()
+        await log_writer.write("file_access_logs", (
+            data.get("user_id"), data.get("file_name"), data.get("action") or "READ", ip, access_time
+        ))
+        ueba_engine.observe_file(data.get("user_id"), data.get("file_name"), data.get("action") or "READ", access_time)
+        risk_cache.invalidate(data.get("user_id"))
+        
+        audit_id = sealer.submit({
+            "type": "FILE_ACCESS",
+            "user": data.get("user_id"),
+            "file": data.get("file_name"),
+            "action": data.get("action"),
+            "ip": ip,
+            "timestamp": str(datetime.now())
+        })
+        return {"status": "SUCCESS", "timestamp": datetime.now().isoformat(), "audit_id": audit_id}
+    except LogWriterFull as e:
+        return JSONResponse(status_code=503, content={"status": "FAIL", "error": str(e)}, headers={"Retry-After": "5"})
+    except Exception as e:
+        return {"status": "FAIL", "error": str(e)}
+
+@app.post("/files/access/batch")
+async def file_access_batch(request: Request):
+    """Bulk file access telemetry: JSON array or NDJSON, optionally gzip, one COPY in one transaction"""
+    try:
+        ip = request.client.host if request.client else "Unknown"
+        events = parse_events(await request.body(), request.headers.get("content-type", ""))
+        records = file_access_records(events, ip)
+        
+        if records:
+            async with get_async_db() as db:
+                async with db.transaction():
+                    await db.copy_records_to_table(
+                        "file_access_logs", records=records, columns=FILE_ACCESS_COLUMNS
+                    )
+            for user_id, file_name, action, _, access_time in records:
+                ueba_engine.observe_file(user_id, file_name, action, access_time)
+            risk_cache.invalidate(*{r[0] for r in records})
+        
+        # One audit transaction per event, like /files/access, so each gets its own
+        # proof; the sealer packs them into blocks
+        audit_ids = [
+            sealer.submit({
+                "type": "FILE_ACCESS",
+                "user": user_id,
+                "file": file_name,
+                "action": action,
+                "ip": ip,
+                "timestamp": str(access_time)
+            })
+            for user_id, file_name, action, _, access_time in records
+        ]
+        
+        return {
+            "status": "SUCCESS",
+            "received": len(events),
+            "inserted": len(records),
+            "rejected": len(events) - len(records),
+            "audit_ids": audit_ids
+        }
+    except ValueError as e:
+        # Malformed JSON/NDJSON or a batch over TELEMETRY_MAX_EVENTS
+        return {"status": "FAIL", "error": f"Invalid batch: {e}"}
     except Exception as e:
         return {"status": "FAIL", "error": str(e)}
 
 @app.get("/admin/file-access")
 def admin_files():
     try:
-        db = get_db()
-        cursor = db.cursor(cursor_factory=__import__('psycopg2.extras', fromlist=['RealDictCursor']).RealDictCursor)
-        cursor.execute("SELECT * FROM file_access_logs ORDER BY access_time DESC LIMIT 100")
-        files = cursor.fetchall()
-        cursor.close()
-        db.close()
-        return [{
-            "user_id": f["user_id"], 
-            "file_name": f["file_name"], 
-            "action": f["action"], 
-            "access_time": str(f["access_time"]), 
-            "ip_address": f["ip_address"]
-        } for f in files]
+        with get_db() as db:
+            cursor = db.cursor(cursor_factory=__import__('psycopg2.extras', fromlist=['RealDictCursor']).RealDictCursor)
+            cursor.execute("SELECT * FROM file_access_logs ORDER BY access_time DESC LIMIT 100")
+            files = cursor.fetchall()
+            cursor.close()
+            return [{
+                "user_id": f["user_id"], 
+                "file_name": f["file_name"], 
+                "action": f["action"], 
+                "access_time": str(f["access_time"]), 
+                "ip_address": f["ip_address"]
+            } for f in files]
     except:
         return []
 
 @app.get("/audit/chain")
-def audit():
-    """Get blockchain audit trail"""
+def audit(start: int = None, limit: int = 10):
+    """Get blockchain audit trail, the latest blocks or `limit` blocks from height `start`"""
     try:
+        limit = max(1, min(limit, 500))
+        if start is None:
+            blocks = blockchain.recent(limit)
+        else:
+            blocks = blockchain.store.range(start, start + limit - 1)
+        
         blocks_with_hash = []
-        for block in blockchain.chain[-10:]:
+        for block in blocks:
             block_copy = block.copy()
-            block_copy['hash'] = blockchain.hash(block)
+            block_copy['hash'] = blockchain.block_hash(block)
             blocks_with_hash.append(block_copy)
         
         return blocks_with_hash
@@ -591,6 +636,54 @@ def audit():
         print(f"Audit chain error: {e}")
         return []
 
+@app.get("/audit/verify")
+def audit_verify(from_height: int = None, to_height: int = None):
+    """Verify the stored chain, by default incrementally from the last verified checkpoint"""
+    try:
+        return blockchain.store.verify(from_height, to_height)
+    except Exception as e:
+        print(f"Audit verify error: {e}")
+        return {"valid": False, "error": str(e)}
+
+@app.get("/audit/proof/{tx_id}")
+def audit_proof(tx_id: str):
+    """Merkle inclusion proof for one login or file-access event"""
+    try:
+        found = blockchain.find_transaction(tx_id)
+        if not found:
+            return {"status": "NOT_FOUND", "message": "Unknown event or block not sealed yet"}
+        
+        block, position = found
+        transactions = block.get('data')
+        if not isinstance(transactions, list) or position >= len(transactions):
+            # The header is sealed but its transactions are gone, nothing to prove against
+            return JSONResponse(status_code=409, content={
+                "status": "FAIL",
+                "error": f"Transactions of block {block['index']} are missing"
+            })
+        transaction = transactions[position]
+        if not isinstance(transaction, dict) or transaction.get('id') != tx_id:
+            # A stale audit_transactions row must not vouch for a different event
+            return JSONResponse(status_code=409, content={
+                "status": "FAIL",
+                "error": f"Block {block['index']} position {position} holds a different transaction"
+            })
+        header = {k: v for k, v in block.items() if k != 'data'}
+        header['hash'] = blockchain.block_hash(block)
+        return {
+            "status": "SUCCESS",
+            "tx_id": tx_id,
+            "height": block['index'],
+            "position": position,
+            "transaction": transaction,
+            "leaf_hash": leaf_hash(transaction),
+            "proof": merkle_proof(transactions, position),
+            "block": header
+        }
+    except Exception as e:
+        print(f"Audit proof error: {e}")
+        return {"status": "FAIL", "error": str(e)}
+
 @app.get("/zones")
 def get_zones():
     """Get micro-segmentation zones"""
@@ -0,0 +1,54 @@
+import hashlib
+import json
+
+# Leaves and inner nodes use different prefixes so a leaf can never pass as a node
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+EMPTY_ROOT = hashlib.sha256(b'').hexdigest()
+
+def leaf_hash(transaction):
+    encoded = json.dumps(transaction, sort_keys=True).encode()
+    return hashlib.sha256(LEAF_PREFIX + encoded).hexdigest()
+
+def node_hash(left, right):
+    return hashlib.sha256(NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+def _next_level(level):
+    # An odd node out is carried up unchanged rather than paired with itself
+    paired = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        paired.append(level[-1])
+    return paired
+
+def merkle_root(transactions):
+    level = [leaf_hash(tx) for tx in transactions]
+    if not level:
+        return EMPTY_ROOT
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0]
+
+def merkle_proof(transactions, index):
+    """Sibling hashes from the leaf at `index` up to the root, O(log n) entries"""
+    level = [leaf_hash(tx) for tx in transactions]
+    proof = []
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({
+                "hash": level[sibling],
+                "position": "left" if sibling < index else "right"
+            })
+        level = _next_level(level)
+        index //= 2
+    return proof
+
+def verify_proof(transaction, proof, root):
+    current = leaf_hash(transaction)
+    for step in proof:
+        if step["position"] == "left":
+            current = node_hash(step["hash"], current)
+        else:
+            current = node_hash(current, step["hash"])
+    return current == root
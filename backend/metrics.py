@@ -1,9 +1,52 @@
 def login_metrics(cursor):
     cursor.execute("""
-        SELECT user_id,
-               COUNT(*) AS total_logins,
-               MAX(login_time) AS last_login
-        FROM login_logs
-        GROUP BY user_id
+        SELECT user_id, total_logins, last_login
+        FROM user_activity_rollup
+        WHERE total_logins > 0
     """)
     return cursor.fetchall()
+
+# Recent login counters from the 5 minute buckets, at most 288 rows per user
+RECENT_LOGINS_SQL = """
+    SELECT COALESCE(SUM(logins), 0) AS logins_24h,
+           COALESCE(SUM(logins) FILTER (WHERE bucket > NOW() - INTERVAL '1 hour'), 0) AS logins_1h
+    FROM user_login_buckets
+    WHERE user_id = r.user_id AND bucket > NOW() - INTERVAL '24 hours'
+"""
+
+ADMIN_OVERVIEW_SQL = f"""
+    SELECT r.user_id,
+           r.total_logins,
+           r.last_login,
+           r.last_ip AS ip_address,
+           r.last_country AS country,
+           r.last_city AS city,
+           r.last_mac AS mac_address,
+           r.last_wifi_ssid AS wifi_ssid,
+           r.last_hostname AS hostname,
+           r.last_os AS os,
+           c.logins_24h,
+           c.logins_1h,
+           u.status
+    FROM user_activity_rollup r
+    LEFT JOIN LATERAL ({RECENT_LOGINS_SQL}) c ON true
+    LEFT JOIN users u ON u.username = r.user_id
+    WHERE r.total_logins > 0
+"""
+
+USER_ACTIVITY_SQL = f"""
+    SELECT r.*, c.logins_24h, c.logins_1h
+    FROM user_activity_rollup r
+    LEFT JOIN LATERAL ({RECENT_LOGINS_SQL}) c ON true
+    WHERE r.user_id = %s
+"""
+
+def admin_overview(cursor):
+    """One row per user with login totals, latest login and latest device"""
+    cursor.execute(ADMIN_OVERVIEW_SQL)
+    return cursor.fetchall()
+
+def user_activity(cursor, username):
+    """The rollup row for one user, or None if they have no activity yet"""
+    cursor.execute(USER_ACTIVITY_SQL, (username,))
+    return cursor.fetchone()
@@ -0,0 +1,85 @@
+"""
+Migration script to add the UEBA query indexes to an existing database.
+Builds every index in init_db.LOG_INDEXES with CREATE INDEX CONCURRENTLY,
+so logins and agents keep writing while it runs (on partitioned tables
+partition by partition, attached to a parent index created ON ONLY),
+then drops the old single-column user_id indexes that the composite ones
+make redundant.
+Safe to run more than once.
+"""
+
+import time
+from database import get_db
+from init_db import LOG_INDEXES
+from partitions import table_kind
+
+# Covered by the leading user_id column of the composite indexes
+REDUNDANT_INDEXES = ["idx_login_user", "idx_device_user", "idx_file_user"]
+
+def _invalid(cursor, name):
+    cursor.execute("""
+        SELECT NOT i.indisvalid FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s
+    """, (name,))
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+def _build_concurrently(cursor, name, definition):
+    # A failed concurrent build leaves an INVALID index behind, rebuild it
+    if _invalid(cursor, name):
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+
+def _build_partitioned(cursor, name, table, spec):
+    # CONCURRENTLY is not supported on a partitioned parent: create the parent
+    # index alone (invalid until every partition has one attached), then build
+    # each partition's index concurrently and attach it
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} {spec}")
+    cursor.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (table,))
+    for (partition,) in cursor.fetchall():
+        cursor.execute("""
+            SELECT 1 FROM pg_inherits i JOIN pg_index x ON x.indexrelid = i.inhrelid
+            WHERE i.inhparent = %s::regclass AND x.indrelid = %s::regclass
+        """, (name, partition))
+        if cursor.fetchone():
+            continue
+        index = f"{partition}_{name}"[:63]
+        _build_concurrently(cursor, index, f"{partition} {spec}")
+        cursor.execute(f"ALTER INDEX {name} ATTACH PARTITION {index}")
+
+def migrate_indexes():
+    with get_db() as db:
+        # CONCURRENTLY cannot run inside a transaction block
+        db.autocommit = True
+        cursor = db.cursor()
+        try:
+            for name, definition in LOG_INDEXES:
+                started = time.perf_counter()
+                table, spec = definition.split(" ", 1)
+                if table_kind(cursor, table) == "p":
+                    _build_partitioned(cursor, name, table, spec)
+                else:
+                    _build_concurrently(cursor, name, definition)
+                print(f"✓ {name} ({time.perf_counter() - started:.1f}s)")
+
+            for name in REDUNDANT_INDEXES:
+                cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                print(f"✓ dropped {name} if present")
+
+            cursor.execute("ANALYZE login_logs")
+            cursor.execute("ANALYZE device_logs")
+            cursor.execute("ANALYZE file_access_logs")
+        finally:
+            cursor.close()
+            db.autocommit = False
+    print("\n✅ Index migration completed!")
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("INDEX MIGRATION SCRIPT")
+    print("=" * 50)
+    migrate_indexes()
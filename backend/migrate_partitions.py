@@ -0,0 +1,112 @@
+"""
+Migration script to convert existing unpartitioned login_logs and
+file_access_logs tables into range-partitioned ones (see partitions.py).
+Run it ONCE, with the backend up or down, before relying on retention.
+
+The old table becomes the "_legacy" partition covering everything up to
+the start of the next period. Its range constraint and the (id, key)
+unique index that replaces its primary key are built while writes
+continue, so the exclusive lock is only held for the catalog-only swap
+at the end. The indexes are then built with migrate_indexes, one
+partition at a time and concurrently. Safe to run more than once.
+"""
+
+from datetime import datetime
+from database import get_db
+from migrate_indexes import migrate_indexes
+from partitions import PARTITIONED_LOGS, add_partitions, next_period, period_start, table_kind
+from rollup import create_rollups
+
+# Give up instead of queueing every writer behind us while a long query holds the table
+LOCK_TIMEOUT = "10s"
+
+def _prepare(cursor, table, key, cutover):
+    # A validated CHECK lets SET NOT NULL and ATTACH skip their full-table scans.
+    # VALIDATE only takes a SHARE UPDATE EXCLUSIVE lock, so writes continue meanwhile
+    cursor.execute(f"UPDATE {table} SET {key} = 'epoch' WHERE {key} IS NULL")
+    cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_legacy_range")
+    cursor.execute(f"""
+        ALTER TABLE {table} ADD CONSTRAINT {table}_legacy_range
+        CHECK ({key} IS NOT NULL AND {key} < %s) NOT VALID
+    """, (cutover,))
+    cursor.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {table}_legacy_range")
+    cursor.execute(f"ALTER TABLE {table} ALTER COLUMN {key} SET NOT NULL")
+
+    # The parent's primary key is (id, key), and a partition cannot have two
+    # primary keys: build the new one's index now, the swap only relabels it
+    index = f"{table}_id_{key}_key"
+    cursor.execute("""
+        SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s
+    """, (index,))
+    row = cursor.fetchone()
+    if row and row[0]:
+        # Left INVALID by an interrupted run
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+    cursor.execute(f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table} (id, {key})")
+
+def _swap(cursor, table, key, columns, cutover):
+    legacy = f"{table}_legacy"
+    cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", (table,))
+    primary = cursor.fetchone()
+    drop_primary = f"DROP CONSTRAINT {primary[0]}, " if primary else ""
+    # Catalog only: the index was built concurrently in _prepare and both columns are NOT NULL
+    cursor.execute(f"""
+        ALTER TABLE {table} {drop_primary}
+        ADD CONSTRAINT {legacy}_pkey PRIMARY KEY USING INDEX {table}_id_{key}_key
+    """)
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    # Index and constraint names are schema wide, free them up for the parent
+    cursor.execute("""
+        SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = %s::regclass AND NOT indisprimary
+    """, (legacy,))
+    for (index,) in cursor.fetchall():
+        cursor.execute(f"ALTER INDEX {index} RENAME TO {(index + '_legacy')[:63]}")
+    # The rollup trigger is recreated on the new parent by create_rollups
+    cursor.execute(f"DROP TRIGGER IF EXISTS {table}_rollup ON {legacy}")
+
+    cursor.execute(f"CREATE TABLE {table} ({columns}) PARTITION BY RANGE ({key})")
+    cursor.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO (%s)",
+                   (cutover,))
+    # Rows for the current period keep landing in the legacy partition until it ends
+    add_partitions(cursor, table, cutover)
+
+def migrate_partitions():
+    # Rows written while this runs must still fit the legacy range
+    cutover = next_period(period_start(datetime.now()))
+    with get_db() as db:
+        cursor = db.cursor()
+        try:
+            cursor.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+            for table, (key, columns) in PARTITIONED_LOGS.items():
+                kind = table_kind(cursor, table)
+                if kind != "r":
+                    print(f"✓ {table} - {'Already partitioned' if kind else 'Missing'}, skipping")
+                    continue
+
+                db.commit()
+                db.autocommit = True
+                _prepare(cursor, table, key, cutover)
+                db.autocommit = False
+
+                _swap(cursor, table, key, columns, cutover)
+                create_rollups(cursor)
+                db.commit()
+                print(f"✓ {table} - Converted, existing rows kept in {table}_legacy")
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            if db.autocommit:
+                db.autocommit = False
+            cursor.close()
+
+    migrate_indexes()
+    print("\n✅ Partition migration completed!")
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("PARTITION MIGRATION SCRIPT")
+    print("=" * 50)
+    migrate_partitions()
@@ -0,0 +1,140 @@
+"""
+Offline IP geolocation backed by a local IP-range database.
+
+The database is a CSV file with a header row:
+
+    start_ip,end_ip,country,city,region,latitude,longitude,timezone,isp,postal
+
+start_ip/end_ip are inclusive and may be written as dotted/colon IP
+addresses or as plain integers (IP2Location/DB-IP style exports). The
+family of an integer cannot be told from its size, so it comes from an
+optional ip_version column (4 or 6) on the row, or else from the file as
+a whole (GEOIP_DB_IP_VERSION, IPv4 by default). IPv4-mapped IPv6 integers,
+as in IP2Location's IPv6 files, go to the IPv4 table.
+Ranges are loaded into sorted arrays per address family and looked up
+with a binary search, so no network call is needed at login time.
+"""
+
+import csv
+import socket
+from bisect import bisect_right
+
+LOCATION_FIELDS = ("country", "city", "region", "latitude", "longitude", "timezone", "isp", "postal")
+
+_IPV4_MAPPED_PREFIX = 0xFFFF << 32
+
+def ip_to_int(ip):
+    """Return (version, integer) for an IP string, or None if it is not an IP"""
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except (OSError, TypeError, ValueError):
+        pass
+    try:
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+    except (OSError, TypeError, ValueError):
+        return None
+    # ::ffff:a.b.c.d is looked up in the IPv4 table
+    if value >> 32 == 0xFFFF:
+        return 4, value - _IPV4_MAPPED_PREFIX
+    return 6, value
+
+def _parse_bound(value, version):
+    """(version, integer) for an address, integers are read as `version`; None if invalid"""
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        if number >> (32 if version == 4 else 128):
+            return None
+        if version == 6 and number >> 32 == 0xFFFF:
+            return 4, number - _IPV4_MAPPED_PREFIX
+        return version, number
+    return ip_to_int(value)
+
+class _RangeTable:
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.locations = []
+
+    def build(self, rows):
+        rows.sort(key=lambda row: row[0])
+        self.starts = [row[0] for row in rows]
+        self.ends = [row[1] for row in rows]
+        self.locations = [row[2] for row in rows]
+
+    def find(self, value):
+        i = bisect_right(self.starts, value) - 1
+        if i >= 0 and value <= self.ends[i]:
+            return self.locations[i]
+        return None
+
+class OfflineGeoDB:
+    def __init__(self):
+        self.v4 = _RangeTable()
+        self.v6 = _RangeTable()
+
+    @classmethod
+    def load(cls, path, integer_version=4):
+        """integer_version: family of integer bounds on rows without an ip_version column"""
+        db = cls()
+        rows = {4: [], 6: []}
+        interned = {}
+
+        with open(path, newline="", encoding="utf-8") as f:
+            for record in csv.DictReader(f):
+                version = (record.get("ip_version") or "").strip()
+                version = int(version) if version in ("4", "6") else integer_version
+                start = _parse_bound(record["start_ip"], version)
+                end = _parse_bound(record["end_ip"], version)
+                if not start or not end:
+                    continue
+                version = max(start[0], end[0])
+
+                location = {
+                    "country": record.get("country") or "Unknown",
+                    "city": record.get("city") or "Unknown",
+                    "region": record.get("region") or "Unknown",
+                    "latitude": float(record.get("latitude") or 0),
+                    "longitude": float(record.get("longitude") or 0),
+                    "timezone": record.get("timezone") or "Unknown",
+                    "isp": record.get("isp") or "Unknown",
+                    "postal": record.get("postal") or "Unknown",
+                }
+                # Many ranges share one location, keep a single copy of each
+                key = tuple(location[field] for field in LOCATION_FIELDS)
+                location = interned.setdefault(key, location)
+
+                rows[version].append((start[1], end[1], location))
+
+        db.v4.build(rows[4])
+        db.v6.build(rows[6])
+        return db
+
+    def __len__(self):
+        return len(self.v4.starts) + len(self.v6.starts)
+
+    def find(self, ip):
+        """Return the shared location record for an IP, or None"""
+        # Inlined version of ip_to_int, this is the hot path
+        if not ip:
+            return None
+        if ":" in ip:
+            try:
+                value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+            except (OSError, ValueError):
+                return None
+            if value >> 32 == 0xFFFF:
+                return self.v4.find(value - _IPV4_MAPPED_PREFIX)
+            return self.v6.find(value)
+        try:
+            value = int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+        except (OSError, ValueError):
+            return None
+        return self.v4.find(value)
+
+    def lookup(self, ip):
+        """Return a get_geolocation-style dict for an IP, or None"""
+        location = self.find(ip)
+        if location is None:
+            return None
+        return {**location, "ip": ip}
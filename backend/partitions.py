@@ -0,0 +1,282 @@
+"""
+Range partitioning and retention for the append-only log tables.
+
+login_logs and file_access_logs are partitioned by their timestamp into
+daily or monthly partitions (LOG_PARTITION_INTERVAL). PartitionMaintainer
+keeps LOG_PARTITIONS_AHEAD future partitions created and detaches or drops
+partitions that are entirely older than LOG_RETENTION_DAYS. Dropping a
+whole partition is a catalog change, so purges leave no dead tuples for
+vacuum to chew through, and queries on recent windows prune to the hot
+partitions.
+
+An existing unpartitioned table is left alone at startup and converted
+by migrate_partitions.py: it becomes the "_legacy" partition covering
+everything up to the start of the next period, and ages out under the
+same retention policy.
+"""
+
+import asyncio
+import os
+import re
+from datetime import datetime, timedelta
+from database import get_db, run_blocking
+from rollup import prune_login_buckets
+
+LOG_PARTITION_INTERVAL = os.getenv("LOG_PARTITION_INTERVAL", "month")  # "month" or "day"
+LOG_PARTITIONS_AHEAD = int(os.getenv("LOG_PARTITIONS_AHEAD", "3"))
+# 0 keeps every partition forever
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "90"))
+# "drop" removes expired partitions, "detach" keeps them as standalone tables for archiving
+LOG_RETENTION_MODE = os.getenv("LOG_RETENTION_MODE", "drop")
+LOG_MAINTENANCE_INTERVAL = float(os.getenv("LOG_MAINTENANCE_INTERVAL", "3600"))
+
+# table -> (partition key, column definitions)
+PARTITIONED_LOGS = {
+    "login_logs": ("login_time", """
+        id INTEGER NOT NULL DEFAULT nextval('login_logs_id_seq'),
+        user_id VARCHAR(50) NOT NULL,
+        login_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        ip_address VARCHAR(45),
+        success BOOLEAN DEFAULT FALSE,
+        country VARCHAR(100) DEFAULT 'Unknown',
+        city VARCHAR(100) DEFAULT 'Unknown',
+        PRIMARY KEY (id, login_time)
+    """),
+    "file_access_logs": ("access_time", """
+        id INTEGER NOT NULL DEFAULT nextval('file_access_logs_id_seq'),
+        user_id VARCHAR(50) NOT NULL,
+        file_name VARCHAR(255) NOT NULL,
+        action VARCHAR(10) DEFAULT 'READ',
+        ip_address VARCHAR(45),
+        access_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, access_time)
+    """),
+}
+
+_BOUND_RE = re.compile(r"FROM \((?:'([^']*)'|MINVALUE)\) TO \((?:'([^']*)'|MAXVALUE)\)")
+
+def period_start(moment, interval=LOG_PARTITION_INTERVAL):
+    if interval == "day":
+        return datetime(moment.year, moment.month, moment.day)
+    return datetime(moment.year, moment.month, 1)
+
+def next_period(start, interval=LOG_PARTITION_INTERVAL):
+    if interval == "day":
+        return start + timedelta(days=1)
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+def partition_name(table, start, interval=LOG_PARTITION_INTERVAL):
+    return f"{table}_p{start:%Y%m%d}" if interval == "day" else f"{table}_p{start:%Y%m}"
+
+def list_partitions(cursor, table):
+    """(name, lower, upper) for each range partition, None for MINVALUE/MAXVALUE"""
+    cursor.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (table,))
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = _BOUND_RE.search(bound or "")
+        if not match:
+            continue  # DEFAULT partition
+        lower, upper = match.groups()
+        partitions.append((
+            name,
+            datetime.fromisoformat(lower) if lower else None,
+            datetime.fromisoformat(upper) if upper else None,
+        ))
+    return partitions
+
+def accepted_range(now=None):
+    """
+    [lower, upper) of event timestamps the log tables take: no older than the
+    retention period, no later than the last partition created ahead of time
+    """
+    now = now or datetime.now()
+    upper = period_start(now)
+    for _ in range(LOG_PARTITIONS_AHEAD + 1):
+        upper = next_period(upper)
+    lower = now - timedelta(days=LOG_RETENTION_DAYS) if LOG_RETENTION_DAYS > 0 else None
+    return lower, upper
+
+def _create_partition(cursor, table, name, start, end):
+    key = PARTITIONED_LOGS[table][0]
+    default = f"{table}_default"
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (default,))
+    if cursor.fetchone()[0]:
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {key} >= %s AND {key} < %s)", (start, end))
+        if cursor.fetchone()[0]:
+            # Postgres refuses a new partition while DEFAULT holds rows in its range:
+            # build it standalone, move the rows over, then attach it
+            cursor.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+            cursor.execute(f"""
+                WITH moved AS (
+                    DELETE FROM {default} WHERE {key} >= %s AND {key} < %s RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            """, (start, end))
+            cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                           (start, end))
+            return
+    cursor.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)", (start, end))
+
+def create_partitions(cursor, table, start, ahead=LOG_PARTITIONS_AHEAD):
+    """Create the partitions for the period containing `start` and `ahead` more, skipping covered ranges"""
+    existing = list_partitions(cursor, table)
+    created = []
+    start = period_start(start)
+    for _ in range(ahead + 1):
+        end = next_period(start)
+        covered = any((lower is None or lower < end) and (upper is None or start < upper)
+                      for _, lower, upper in existing)
+        if not covered:
+            name = partition_name(table, start)
+            _create_partition(cursor, table, name, start, end)
+            existing.append((name, start, end))
+            created.append(name)
+        start = end
+    return created
+
+def expire_partitions(cursor, table, cutoff, mode=LOG_RETENTION_MODE):
+    """Detach, and unless mode is "detach" drop, partitions that end on or before cutoff"""
+    removed = []
+    for name, _, upper in list_partitions(cursor, table):
+        if upper is None or upper > cutoff:
+            continue
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        if mode != "detach":
+            cursor.execute(f"DROP TABLE {name}")
+        removed.append(name)
+
+    # Rows in DEFAULT are not covered by any partition bound, delete them row by row
+    key = PARTITIONED_LOGS[table][0]
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (f"{table}_default",))
+    if cursor.fetchone()[0]:
+        cursor.execute(f"DELETE FROM {table}_default WHERE {key} < %s", (cutoff,))
+    return removed
+
+def table_kind(cursor, table):
+    """pg_class.relkind of `table`: "p" partitioned, "r" plain, None if it does not exist"""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def add_partitions(cursor, table, first):
+    # Late or clock-skewed events land here instead of failing a whole batch
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+    create_partitions(cursor, table, first)
+
+def ensure_partitioned(cursor, table, now=None):
+    """Create `table` as a partitioned table if it does not exist yet"""
+    key, columns = PARTITIONED_LOGS[table]
+    kind = table_kind(cursor, table)
+    if kind == "p":
+        return
+    if kind:
+        # Converting takes an exclusive lock on the whole table, never do it on startup
+        print(f"{table} is not partitioned yet, run migrate_partitions.py to convert it")
+        return
+
+    cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {table}_id_seq")
+    cursor.execute(f"CREATE TABLE {table} ({columns}) PARTITION BY RANGE ({key})")
+    cursor.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    add_partitions(cursor, table, now or datetime.now())
+
+def _maintain_table(table, now):
+    with get_db() as db:
+        cursor = db.cursor()
+        try:
+            if table_kind(cursor, table) != "p":
+                return [], []  # Waiting for migrate_partitions.py
+            created = create_partitions(cursor, table, now)
+            removed = []
+            if LOG_RETENTION_DAYS > 0:
+                removed = expire_partitions(cursor, table, now - timedelta(days=LOG_RETENTION_DAYS))
+            db.commit()
+            return created, removed
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            cursor.close()
+
+def _prune_buckets():
+    with get_db() as db:
+        cursor = db.cursor()
+        pruned = prune_login_buckets(cursor)
+        db.commit()
+        cursor.close()
+        return pruned
+
+def maintain_partitions(now=None):
+    """Each table and the bucket prune run in their own transaction, so one failure does not block the others"""
+    now = now or datetime.now()
+    result = {"created": [], "removed": [], "errors": {}}
+    for table in PARTITIONED_LOGS:
+        try:
+            created, removed = _maintain_table(table, now)
+            result["created"] += created
+            result["removed"] += removed
+        except Exception as e:
+            result["errors"][table] = str(e)
+    try:
+        result["pruned_buckets"] = _prune_buckets()
+    except Exception as e:
+        result["errors"]["user_login_buckets"] = str(e)
+    return result
+
+class PartitionMaintainer:
+    """Background task that runs maintain_partitions every LOG_MAINTENANCE_INTERVAL seconds"""
+
+    def __init__(self, interval=LOG_MAINTENANCE_INTERVAL):
+        self.interval = interval
+        self._task = None
+        self.runs = 0
+        self.last_run = None
+        self.last_result = None
+        self.last_error = None
+
+    def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                self.last_result = await run_blocking(maintain_partitions)
+                self.last_error = "; ".join(f"{name}: {error}" for name, error in self.last_result["errors"].items()) or None
+                if self.last_result["created"] or self.last_result["removed"] or self.last_error:
+                    print(f"Log partitions: {self.last_result}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Partition maintenance error: {e}")
+            self.runs += 1
+            self.last_run = datetime.now().isoformat()
+            await asyncio.sleep(self.interval)
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "partition_interval": LOG_PARTITION_INTERVAL,
+            "retention_days": LOG_RETENTION_DAYS,
+            "retention_mode": LOG_RETENTION_MODE,
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+partition_maintainer = PartitionMaintainer()
@@ -1,23 +1,29 @@
-def calculate_risk(ueba):
-    weights = {
-        "ODD_LOGIN_TIME": 15,
-        "FAILED_LOGIN": 25,
-        "MULTIPLE_LOGIN_ATTEMPTS": 30,
-        "EXTERNAL_NETWORK": 25,
-        "UNKNOWN_DEVICE_ID": 35,
-        "HOTSPOT_NETWORK": 20,
-        "UNTRUSTED_DEVICE": 30,
-        "DEVICE_CHANGE_DETECTED": 35,
-        "SENSITIVE_FILE_ACCESS": 40,
-        "GEOLOCATION_ANOMALY": 45,
-        "MULTIPLE_IP_ADDRESSES": 30,
-        "FILE_DELETION": 35,
-        "EXCESSIVE_FILE_ACCESS": 40,
-    }
+RISK_WEIGHTS = {
+    "ODD_LOGIN_TIME": 15,
+    "FAILED_LOGIN": 25,
+    "MULTIPLE_LOGIN_ATTEMPTS": 30,
+    "EXTERNAL_NETWORK": 25,
+    "UNKNOWN_DEVICE_ID": 35,
+    "HOTSPOT_NETWORK": 20,
+    "UNTRUSTED_DEVICE": 30,
+    "DEVICE_CHANGE_DETECTED": 35,
+    "SENSITIVE_FILE_ACCESS": 40,
+    "GEOLOCATION_ANOMALY": 45,
+    "MULTIPLE_IP_ADDRESSES": 30,
+    "FILE_DELETION": 35,
+    "EXCESSIVE_FILE_ACCESS": 40,
+}
+
+# Signal vocabulary as integer IDs, in RISK_WEIGHTS order
+SIGNAL_IDS = {signal: i for i, signal in enumerate(RISK_WEIGHTS)}
+
+RISK_LEVELS = [(90, "CRITICAL"), (70, "HIGH"), (50, "MEDIUM"), (30, "LOW")]
+LEVEL_NAMES = [level for _, level in RISK_LEVELS] + ["MINIMAL"]
 
+def calculate_risk(ueba):
     risk = {}
     for user, signals in ueba.items():
-        score = sum(weights.get(s, 0) for s in signals)
+        score = sum(RISK_WEIGHTS.get(s, 0) for s in signals)
         risk[user] = {
             "score": min(score, 100),
             "events": signals,
@@ -25,6 +31,53 @@ def calculate_risk(ueba):
         }
     return risk
 
+def calculate_risk_bulk(ueba):
+    """
+    Same result as calculate_risk, for fleet-wide rescoring.
+    Each distinct signal list is encoded once as a row of signal-ID counts;
+    scores come from one matrix-vector product and levels from np.select.
+    """
+    from collections import defaultdict
+    from itertools import chain
+    import numpy as np
+
+    users = list(ueba.keys())
+    if not users:
+        return {}
+    signal_lists = list(ueba.values())
+
+    # Many users share the same signal combination, encode each one once.
+    # map() keeps the per-user work in C.
+    keys = list(map(tuple, signal_lists))
+    combos = dict.fromkeys(keys)
+    for i, combo in enumerate(combos):
+        combos[combo] = i
+    combo_ids = np.fromiter(map(combos.__getitem__, keys), dtype=np.int64, count=len(keys))
+
+    # Unknown signals map to an extra zero-weight column
+    unknown = len(SIGNAL_IDS)
+    width = unknown + 1
+    lengths = np.fromiter(map(len, combos), dtype=np.int64, count=len(combos))
+    rows = np.repeat(np.arange(len(combos), dtype=np.int64), lengths)
+    column_of = defaultdict(lambda: unknown, SIGNAL_IDS)
+    columns = np.fromiter(map(column_of.__getitem__, chain.from_iterable(combos)),
+                          dtype=np.int64, count=int(lengths.sum()))
+    counts = np.bincount(rows * width + columns, minlength=len(combos) * width).reshape(len(combos), width)
+
+    weights = np.array(list(RISK_WEIGHTS.values()) + [0], dtype=np.int64)
+    scores = (counts @ weights)[combo_ids]
+
+    # Level as an index into LEVEL_NAMES, so every user shares the same str objects
+    levels = np.select([scores >= threshold for threshold, _ in RISK_LEVELS],
+                       list(range(len(RISK_LEVELS))), default=len(RISK_LEVELS))
+    capped = np.minimum(scores, 100)
+
+    return {
+        user: {"score": score, "events": signals, "level": level}
+        for user, signals, score, level in zip(users, signal_lists, capped.tolist(),
+                                               map(LEVEL_NAMES.__getitem__, levels.tolist()))
+    }
+
 def get_risk_level(score: int) -> str:
     if score >= 90:
         return "CRITICAL"
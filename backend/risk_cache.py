@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+RISK_CACHE_TTL = float(os.getenv("RISK_CACHE_TTL", "30"))
+RISK_CACHE_SIZE = int(os.getenv("RISK_CACHE_SIZE", "10000"))
+
+class RiskCache:
+    """
+    Per-user risk score cache with a short TTL.
+    Writers call invalidate(user) when a login, device or file event for the
+    user is recorded (and again once it is flushed to the database). Each user
+    has a generation counter, so a score computed from data that was
+    invalidated mid-computation is never stored.
+    """
+
+    def __init__(self, maxsize=RISK_CACHE_SIZE, ttl=RISK_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user -> (computed_at, value)
+        self._generations = {}  # user -> counter value at its last invalidation
+        self._counter = 0
+        self._floor = 0  # generation of users dropped from _generations
+        self._lock = threading.Lock()
+        self._age_total = 0.0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "evictions": 0,
+            "discarded": 0,
+        }
+
+    def _lookup(self, user, now):
+        entry = self._entries.get(user)
+        if entry:
+            computed_at, value = entry
+            if now - computed_at < self.ttl:
+                self._entries.move_to_end(user)
+                self._stats["hits"] += 1
+                self._age_total += now - computed_at
+                return value
+            del self._entries[user]
+            self._stats["expirations"] += 1
+        self._stats["misses"] += 1
+        return None
+
+    def _store(self, user, value, generation, computed_at):
+        if self._generations.get(user, self._floor) != generation:
+            # Invalidated while we were computing
+            self._stats["discarded"] += 1
+            return
+        self._entries[user] = (computed_at, value)
+        self._entries.move_to_end(user)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, user, compute):
+        """Cached score for `user`, or compute(user) and cache it"""
+        with self._lock:
+            now = time.monotonic()
+            value = self._lookup(user, now)
+            if value is not None:
+                return value
+            generation = self._generations.get(user, self._floor)
+
+        value = compute(user)
+        with self._lock:
+            self._store(user, value, generation, now)
+        return value
+
+    def get_many(self, users, compute_many):
+        """Like get() for a list of users, compute_many(missing) returns {user: score}"""
+        result = {}
+        with self._lock:
+            now = time.monotonic()
+            generations = {}
+            for user in users:
+                value = self._lookup(user, now)
+                if value is not None:
+                    result[user] = value
+                else:
+                    generations[user] = self._generations.get(user, self._floor)
+
+        if generations:
+            computed = compute_many(list(generations))
+            with self._lock:
+                for user, value in computed.items():
+                    if user in generations:
+                        self._store(user, value, generations[user], now)
+            result.update(computed)
+        return result
+
+    def invalidate(self, *users):
+        with self._lock:
+            for user in users:
+                if user is None:
+                    continue
+                self._counter += 1
+                self._generations[user] = self._counter
+                if self._entries.pop(user, None) is not None:
+                    self._stats["invalidations"] += 1
+            # Keep the map bounded. Forgotten users read as the current counter,
+            # which no computation started before this point can match.
+            if len(self._generations) > self.maxsize * 2:
+                self._floor = self._counter
+                self._generations.clear()
+
+    def clear(self):
+        with self._lock:
+            self._counter += 1
+            self._floor = self._counter
+            self._generations.clear()
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            served = self._stats["hits"] + self._stats["misses"]
+            now = time.monotonic()
+            ages = [now - computed_at for computed_at, _ in self._entries.values()]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "max_size": self.maxsize,
+                "ttl": self.ttl,
+                "hit_rate": round(self._stats["hits"] / served, 3) if served else 0,
+                # How old the scores we answered from memory were, and are
+                "avg_hit_age": round(self._age_total / self._stats["hits"], 2) if self._stats["hits"] else 0,
+                "max_entry_age": round(max(ages), 2) if ages else 0,
+            }
+
+risk_cache = RiskCache()
@@ -0,0 +1,151 @@
+"""
+Per-user activity rollups maintained by triggers.
+
+user_activity_rollup has one row per user with lifetime login count,
+the latest login (time, IP, country, city) and the latest device.
+user_login_buckets counts logins per user in 5 minute buckets, so the
+24h/1h counters are a sum over at most 288 rows of one user.
+
+Login rows are folded in by a statement-level trigger over the inserted
+rows, so a COPY or multi-row INSERT costs one upsert per user rather than
+one per row. Device registrations are rare upserts and use a row trigger.
+"""
+
+BUCKET_SECONDS = 300
+# Buckets older than this are pruned by the maintenance job
+BUCKET_RETENTION = "48 hours"
+
+ROLLUP_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS user_activity_rollup (
+        user_id VARCHAR(50) PRIMARY KEY,
+        total_logins BIGINT NOT NULL DEFAULT 0,
+        last_login TIMESTAMP,
+        last_ip VARCHAR(45),
+        last_country VARCHAR(100),
+        last_city VARCHAR(100),
+        last_device_seen TIMESTAMP,
+        last_mac VARCHAR(17),
+        last_wifi_ssid VARCHAR(100),
+        last_hostname VARCHAR(100),
+        last_os VARCHAR(50),
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS user_login_buckets (
+        user_id VARCHAR(50) NOT NULL,
+        bucket TIMESTAMP NOT NULL,
+        logins INTEGER NOT NULL,
+        PRIMARY KEY (user_id, bucket)
+    );
+"""
+
+LOGIN_BUCKET_EXPR = f"(to_timestamp(floor(extract(epoch FROM login_time) / {BUCKET_SECONDS}) * {BUCKET_SECONDS}) AT TIME ZONE 'UTC')"
+
+ROLLUP_FUNCTIONS_SQL = f"""
+    CREATE OR REPLACE FUNCTION rollup_login_logs() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO user_activity_rollup AS r
+            (user_id, total_logins, last_login, last_ip, last_country, last_city, updated_at)
+        SELECT DISTINCT ON (user_id)
+            user_id, COUNT(*) OVER (PARTITION BY user_id), login_time, ip_address, country, city, NOW()
+        FROM new_rows
+        ORDER BY user_id, login_time DESC
+        ON CONFLICT (user_id) DO UPDATE SET
+            total_logins = r.total_logins + EXCLUDED.total_logins,
+            last_ip = CASE WHEN r.last_login IS NULL OR EXCLUDED.last_login >= r.last_login
+                      THEN EXCLUDED.last_ip ELSE r.last_ip END,
+            last_country = CASE WHEN r.last_login IS NULL OR EXCLUDED.last_login >= r.last_login
+                           THEN EXCLUDED.last_country ELSE r.last_country END,
+            last_city = CASE WHEN r.last_login IS NULL OR EXCLUDED.last_login >= r.last_login
+                        THEN EXCLUDED.last_city ELSE r.last_city END,
+            last_login = GREATEST(r.last_login, EXCLUDED.last_login),
+            updated_at = NOW();
+
+        INSERT INTO user_login_buckets AS b (user_id, bucket, logins)
+        SELECT user_id, {LOGIN_BUCKET_EXPR}, COUNT(*)
+        FROM new_rows
+        GROUP BY 1, 2
+        ON CONFLICT (user_id, bucket) DO UPDATE SET logins = b.logins + EXCLUDED.logins;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION rollup_device_logs() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO user_activity_rollup AS r
+            (user_id, last_device_seen, last_mac, last_wifi_ssid, last_hostname, last_os, updated_at)
+        VALUES (NEW.user_id, NEW.first_seen, NEW.mac_address, NEW.wifi_ssid, NEW.hostname, NEW.os, NOW())
+        ON CONFLICT (user_id) DO UPDATE SET
+            last_mac = CASE WHEN r.last_device_seen IS NULL OR EXCLUDED.last_device_seen >= r.last_device_seen
+                       THEN EXCLUDED.last_mac ELSE r.last_mac END,
+            last_wifi_ssid = CASE WHEN r.last_device_seen IS NULL OR EXCLUDED.last_device_seen >= r.last_device_seen
+                             THEN EXCLUDED.last_wifi_ssid ELSE r.last_wifi_ssid END,
+            last_hostname = CASE WHEN r.last_device_seen IS NULL OR EXCLUDED.last_device_seen >= r.last_device_seen
+                            THEN EXCLUDED.last_hostname ELSE r.last_hostname END,
+            last_os = CASE WHEN r.last_device_seen IS NULL OR EXCLUDED.last_device_seen >= r.last_device_seen
+                      THEN EXCLUDED.last_os ELSE r.last_os END,
+            last_device_seen = GREATEST(r.last_device_seen, EXCLUDED.last_device_seen),
+            updated_at = NOW();
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+"""
+
+ROLLUP_TRIGGERS_SQL = """
+    DROP TRIGGER IF EXISTS login_logs_rollup ON login_logs;
+    CREATE TRIGGER login_logs_rollup
+        AFTER INSERT ON login_logs
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION rollup_login_logs();
+
+    DROP TRIGGER IF EXISTS device_logs_rollup ON device_logs;
+    CREATE TRIGGER device_logs_rollup
+        AFTER INSERT OR UPDATE ON device_logs
+        FOR EACH ROW EXECUTE FUNCTION rollup_device_logs();
+"""
+
+# Rebuilds the rollups from the raw logs, used once when the tables are new
+ROLLUP_BACKFILL_SQL = f"""
+    INSERT INTO user_activity_rollup (user_id, total_logins, last_login, last_ip, last_country, last_city)
+    SELECT t.user_id, t.total_logins, t.last_login, ll.ip_address, ll.country, ll.city
+    FROM (
+        SELECT user_id, COUNT(*) AS total_logins, MAX(login_time) AS last_login
+        FROM login_logs GROUP BY user_id
+    ) t
+    LEFT JOIN LATERAL (
+        SELECT ip_address, country, city FROM login_logs
+        WHERE user_id = t.user_id ORDER BY login_time DESC LIMIT 1
+    ) ll ON true;
+
+    INSERT INTO user_activity_rollup AS r (user_id, last_device_seen, last_mac, last_wifi_ssid, last_hostname, last_os)
+    SELECT DISTINCT ON (user_id) user_id, first_seen, mac_address, wifi_ssid, hostname, os
+    FROM device_logs
+    ORDER BY user_id, first_seen DESC NULLS LAST
+    ON CONFLICT (user_id) DO UPDATE SET
+        last_device_seen = EXCLUDED.last_device_seen,
+        last_mac = EXCLUDED.last_mac,
+        last_wifi_ssid = EXCLUDED.last_wifi_ssid,
+        last_hostname = EXCLUDED.last_hostname,
+        last_os = EXCLUDED.last_os;
+
+    INSERT INTO user_login_buckets (user_id, bucket, logins)
+    SELECT user_id, {LOGIN_BUCKET_EXPR}, COUNT(*)
+    FROM login_logs
+    WHERE login_time > NOW() - INTERVAL '{BUCKET_RETENTION}'
+    GROUP BY 1, 2;
+"""
+
+def create_rollups(cursor):
+    """Create the rollup tables and triggers, backfilling them if they are new"""
+    cursor.execute("SELECT to_regclass('user_activity_rollup') IS NULL")
+    new = cursor.fetchone()[0]
+    cursor.execute(ROLLUP_TABLES_SQL)
+    cursor.execute(ROLLUP_FUNCTIONS_SQL)
+    # CREATE TRIGGER locks out writers until commit, so nothing is counted twice
+    cursor.execute(ROLLUP_TRIGGERS_SQL)
+    if new:
+        cursor.execute(ROLLUP_BACKFILL_SQL)
+
+def prune_login_buckets(cursor):
+    cursor.execute(f"DELETE FROM user_login_buckets WHERE bucket < NOW() - INTERVAL '{BUCKET_RETENTION}'")
+    return cursor.rowcount
@@ -18,7 +18,8 @@ CREATE TABLE IF NOT EXISTS login_logs (
     city VARCHAR(100) DEFAULT 'Unknown'
 );
 
-CREATE INDEX IF NOT EXISTS idx_login_user ON login_logs(user_id);
+CREATE INDEX IF NOT EXISTS idx_login_logs_user_time ON login_logs(user_id, login_time DESC) INCLUDE (success, ip_address);
+CREATE INDEX IF NOT EXISTS idx_login_logs_failed ON login_logs(user_id, login_time DESC) WHERE success = false;
 CREATE INDEX IF NOT EXISTS idx_login_time ON login_logs(login_time);
 
 CREATE TABLE IF NOT EXISTS device_logs (
@@ -34,7 +35,8 @@ CREATE TABLE IF NOT EXISTS device_logs (
     ip_address VARCHAR(45)
 );
 
-CREATE INDEX IF NOT EXISTS idx_device_user ON device_logs(user_id);
+CREATE INDEX IF NOT EXISTS idx_device_logs_user_seen ON device_logs(user_id, first_seen DESC);
+CREATE INDEX IF NOT EXISTS idx_device_logs_untrusted ON device_logs(user_id) WHERE trusted = false;
 CREATE INDEX IF NOT EXISTS idx_device_id ON device_logs(device_id);
 
 CREATE TABLE IF NOT EXISTS file_access_logs (
@@ -46,7 +48,8 @@ CREATE TABLE IF NOT EXISTS file_access_logs (
     access_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE INDEX IF NOT EXISTS idx_file_user ON file_access_logs(user_id);
+CREATE INDEX IF NOT EXISTS idx_file_access_user_time ON file_access_logs(user_id, access_time DESC);
+CREATE INDEX IF NOT EXISTS idx_file_access_deletes ON file_access_logs(user_id, access_time DESC) WHERE action = 'DELETE';
 CREATE INDEX IF NOT EXISTS idx_file_time ON file_access_logs(access_time);
 
 -- Insert default users (plain passwords for testing)
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from blockchain import proof_of_work
+
+# A block is sealed once it has this many transactions...
+SEAL_BATCH_SIZE = int(os.getenv("SEAL_BATCH_SIZE", "3"))
+# ...or when its oldest transaction has waited this many seconds
+SEAL_INTERVAL = float(os.getenv("SEAL_INTERVAL", "30"))
+SEAL_WORKERS = int(os.getenv("SEAL_WORKERS", "1"))
+
+class BlockSealer:
+    """Background task that batches audit transactions and mines blocks off the request path"""
+
+    def __init__(self, blockchain, batch_size, interval, workers):
+        self.blockchain = blockchain
+        self.batch_size = batch_size
+        self.interval = interval
+        self.workers = workers
+        self.queue = None
+        self._batch = []
+        self._task = None
+        self._executor = None
+        self.blocks_sealed = 0
+
+    def submit(self, transaction):
+        """Queue a transaction for the next block, never blocks the caller. Returns its id."""
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        transaction.setdefault("id", uuid.uuid4().hex)
+        self.queue.put_nowait(transaction)
+        return transaction["id"]
+
+    def start(self):
+        if self._task:
+            return
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the sealer and seal whatever is still pending"""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        while not self.queue.empty():
+            self._batch.append(self.queue.get_nowait())
+        try:
+            while self._batch:
+                batch = self._batch[:self.batch_size]
+                await self._seal(batch)
+                del self._batch[:len(batch)]
+        finally:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self._collect()
+                await self._seal(self._batch)
+                self._batch = []
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Block sealer error: {e}")
+                await asyncio.sleep(1)
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        if not self._batch:
+            self._batch.append(await self.queue.get())
+        deadline = loop.time() + self.interval
+
+        while len(self._batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                self._batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _seal(self, batch):
+        loop = asyncio.get_running_loop()
+        # Raises while the chain store cannot take blocks, the batch is kept and retried
+        await loop.run_in_executor(None, self.blockchain.ensure_writable)
+        previous_block = self.blockchain.get_previous_block()
+        proof = await loop.run_in_executor(self._executor, proof_of_work, previous_block['proof'])
+        previous_hash = self.blockchain.block_hash(previous_block)
+        self.blockchain.create_block(proof, previous_hash, list(batch))
+        self.blocks_sealed += 1
+
+    def stats(self):
+        return {
+            "pending": (self.queue.qsize() if self.queue else 0) + len(self._batch),
+            "blocks_sealed": self.blocks_sealed,
+            "batch_size": self.batch_size,
+            "interval": self.interval,
+        }
@@ -0,0 +1,181 @@
+"""
+Bulk telemetry ingestion helpers.
+
+Agents post a whole scan cycle of file access events at once, either as a
+JSON array (optionally wrapped as {"user_id": ..., "events": [...]}) or as
+NDJSON, one event per line. Bodies may be gzip compressed with
+Content-Encoding: gzip, which GzipRequestMiddleware undoes before the
+request reaches any endpoint. It inflates chunk by chunk as the body
+arrives and answers 413 as soon as either the compressed or the inflated
+size passes its limit, so a gzip bomb never sits in memory whole.
+"""
+
+import json
+import os
+import zlib
+from datetime import datetime
+from starlette.responses import JSONResponse
+from partitions import accepted_range
+
+TELEMETRY_MAX_EVENTS = int(os.getenv("TELEMETRY_MAX_EVENTS", "5000"))
+# Limit on the decompressed body, a small gzip body can inflate enormously
+TELEMETRY_MAX_BODY = int(os.getenv("TELEMETRY_MAX_BODY", str(16 * 1024 * 1024)))
+# Limit on the gzip body as sent
+TELEMETRY_MAX_COMPRESSED_BODY = int(os.getenv("TELEMETRY_MAX_COMPRESSED_BODY", str(4 * 1024 * 1024)))
+
+FILE_ACCESS_COLUMNS = ("user_id", "file_name", "action", "ip_address", "access_time")
+
+class TelemetryError(ValueError):
+    pass
+
+class BodyTooLarge(TelemetryError):
+    pass
+
+class _Gunzip:
+    """Incremental gzip decoder that refuses to read or produce more than its limits"""
+
+    def __init__(self, max_size=TELEMETRY_MAX_BODY, max_compressed=TELEMETRY_MAX_COMPRESSED_BODY):
+        self.max_size = max_size
+        self.max_compressed = max_compressed
+        self.received = 0
+        self.size = 0
+        self.chunks = []
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def feed(self, chunk):
+        self.received += len(chunk)
+        if self.received > self.max_compressed:
+            raise BodyTooLarge(f"Compressed body exceeds {self.max_compressed} bytes")
+        # One byte over the limit is enough to tell it was exceeded
+        data = self._decompressor.decompress(chunk, self.max_size - self.size + 1)
+        self.size += len(data)
+        if self.size > self.max_size or self._decompressor.unconsumed_tail:
+            raise BodyTooLarge(f"Decompressed body exceeds {self.max_size} bytes")
+        self.chunks.append(data)
+
+    def result(self):
+        if not self._decompressor.eof:
+            raise TelemetryError("Truncated gzip body")
+        return b"".join(self.chunks)
+
+def gunzip(body, max_size=TELEMETRY_MAX_BODY, max_compressed=TELEMETRY_MAX_COMPRESSED_BODY):
+    decoder = _Gunzip(max_size, max_compressed)
+    decoder.feed(body)
+    return decoder.result()
+
+class GzipRequestMiddleware:
+    """ASGI middleware that inflates request bodies sent with Content-Encoding: gzip"""
+
+    def __init__(self, app, max_size=TELEMETRY_MAX_BODY, max_compressed=TELEMETRY_MAX_COMPRESSED_BODY):
+        self.app = app
+        self.max_size = max_size
+        self.max_compressed = max_compressed
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_headers = dict(scope["headers"])
+        encoding = request_headers.get(b"content-encoding", b"").strip().lower()
+        if encoding != b"gzip":
+            return await self.app(scope, receive, send)
+
+        decoder = _Gunzip(self.max_size, self.max_compressed)
+        try:
+            length = request_headers.get(b"content-length", b"")
+            if length.isdigit() and int(length) > self.max_compressed:
+                raise BodyTooLarge(f"Compressed body exceeds {self.max_compressed} bytes")
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                decoder.feed(message.get("body", b""))
+                more_body = message.get("more_body", False)
+            body = decoder.result()
+        except BodyTooLarge as e:
+            response = JSONResponse({"status": "FAIL", "error": f"Body too large: {e}"}, status_code=413)
+            return await response(scope, receive, send)
+        except (TelemetryError, zlib.error) as e:
+            response = JSONResponse({"status": "FAIL", "error": f"Invalid gzip body: {e}"}, status_code=400)
+            return await response(scope, receive, send)
+
+        headers = [(k, v) for k, v in scope["headers"] if k not in (b"content-encoding", b"content-length")]
+        headers.append((b"content-length", str(len(body)).encode()))
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app({**scope, "headers": headers}, replay, send)
+
+def parse_events(body, content_type=""):
+    """Decode a JSON array, {"events": [...]} or NDJSON body into a list of dicts"""
+    text = body.decode("utf-8").strip()
+    if not text:
+        return []
+    if "ndjson" in content_type or "jsonlines" in content_type or not text.startswith(("[", "{")):
+        events = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        try:
+            payload = json.loads(text)
+        except json.JSONDecodeError:
+            # A body starting with "{" can still be NDJSON
+            events = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            if isinstance(payload, dict) and "events" in payload:
+                default_user = payload.get("user_id")
+                events = [{"user_id": default_user, **event} if isinstance(event, dict) else event
+                          for event in payload["events"]]
+            elif isinstance(payload, dict):
+                events = [payload]
+            else:
+                events = payload
+
+    if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+        raise TelemetryError("Expected a list of event objects")
+    if len(events) > TELEMETRY_MAX_EVENTS:
+        raise TelemetryError(f"Batch has {len(events)} events, limit is {TELEMETRY_MAX_EVENTS}")
+    return events
+
+def _event_time(event, now, lower, upper):
+    """The event's own timestamp, now if it has none or is ahead of the partitions, None if past retention"""
+    value = event.get("access_time") or event.get("timestamp")
+    if not value:
+        return now
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return now
+    # access_time is a naive local TIMESTAMP, like NOW()
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    if lower is not None and parsed < lower:
+        return None
+    # Clock skew: anything past the pre-created partitions would land in DEFAULT
+    if parsed >= upper:
+        return now
+    return parsed
+
+def file_access_records(events, ip):
+    """Rows for file_access_logs in FILE_ACCESS_COLUMNS order, invalid or expired events are skipped"""
+    now = datetime.now()
+    lower, upper = accepted_range(now)
+    records = []
+    for event in events:
+        user_id = event.get("user_id")
+        file_name = event.get("file_name")
+        access_time = _event_time(event, now, lower, upper)
+        if not user_id or not file_name or access_time is None:
+            continue
+        records.append((
+            str(user_id)[:50],
+            str(file_name)[:255],
+            str(event.get("action") or "READ")[:10],
+            ip,
+            access_time,
+        ))
+    return records
@@ -0,0 +1,63 @@
+"""
+Runs the chain store against a real, disposable Postgres database:
+TEST_DATABASE_URL=postgresql://user@host/scratch python -m pytest test_chain_store.py
+The audit tables in that database are emptied.
+"""
+
+import os
+
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+@pytest.fixture
+def cursor(monkeypatch):
+    import database
+    # The pool may already exist if another test imported database first
+    monkeypatch.setattr(database.pool, "dsn", TEST_DATABASE_URL)
+    from database import get_db
+    from init_db import init_database
+    init_database()
+    with get_db() as db:
+        cursor = db.cursor()
+        cursor.execute("TRUNCATE audit_blocks, audit_transactions, audit_forks, audit_checkpoint")
+        db.commit()
+        yield cursor
+        cursor.close()
+
+def _seal(chain, *transactions):
+    tip = chain.get_previous_block()
+    return chain.create_block(tip['proof'] + 1, chain.block_hash(tip), list(transactions))
+
+def test_height_conflict_is_kept_and_sealing_resumes_from_stored_tip(cursor):
+    from blockchain import Blockchain
+    from chain_store import ChainStoreError, PostgresChainStore
+    first, second = Blockchain(store=PostgresChainStore()), Blockchain(store=PostgresChainStore())
+    first.restore()
+    second.restore()
+    _seal(first, {"id": "a1"})
+    first.store.flush()
+
+    # Both sealed on top of the same genesis, the second writer loses height 1
+    _seal(second, {"id": "b1"})
+    second.store.flush()
+    assert second.store.forked
+    with pytest.raises(ChainStoreError):
+        _seal(second, {"id": "b2"})
+    cursor.execute("SELECT COUNT(*) FROM audit_forks")
+    assert cursor.fetchone()[0] == 2
+
+    second.ensure_writable()
+    block = _seal(second, {"id": "b2"})
+    second.store.flush()
+    assert block['index'] == 3
+    assert second.store.verify(from_height=1)["valid"]
+
+def test_sealing_waits_for_restore(cursor):
+    from blockchain import Blockchain
+    from chain_store import PostgresChainStore
+    chain = Blockchain(store=PostgresChainStore())
+    assert not chain.restored
+    chain.ensure_writable()
+    assert chain.restored
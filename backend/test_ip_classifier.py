@@ -0,0 +1,16 @@
+from pathlib import Path
+
+from ip_classifier import IPClassifier
+
+def test_agent_copy_is_identical():
+    backend = Path(__file__).with_name("ip_classifier.py")
+    agent = Path(__file__).resolve().parent.parent / "agent" / "ip_classifier.py"
+    assert agent.read_bytes() == backend.read_bytes(), "agent/ip_classifier.py must be a copy of backend/ip_classifier.py"
+
+def test_longest_prefix_wins():
+    classifier = IPClassifier(corporate=["10.20.0.0/16"])
+    assert classifier.classify("10.20.1.5") == "corporate"
+    assert classifier.classify("10.21.1.5") == "private"
+    assert classifier.classify("::ffff:192.168.1.1") == "private"
+    assert classifier.classify("8.8.8.8") == "external"
+    assert classifier.classify("not an ip") == "invalid"
@@ -0,0 +1,80 @@
+"""
+Runs migrate_partitions against a real, disposable Postgres database:
+TEST_DATABASE_URL=postgresql://user@host/scratch python -m pytest test_migrate_partitions.py
+The log tables in that database are dropped and recreated.
+"""
+
+import os
+
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+# The unpartitioned tables as init_db created them before partitioning
+LEGACY_TABLES_SQL = """
+    DROP TABLE IF EXISTS login_logs, file_access_logs CASCADE;
+    CREATE TABLE login_logs (
+        id SERIAL PRIMARY KEY,
+        user_id VARCHAR(50) NOT NULL,
+        login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        ip_address VARCHAR(45),
+        success BOOLEAN DEFAULT FALSE,
+        country VARCHAR(100) DEFAULT 'Unknown',
+        city VARCHAR(100) DEFAULT 'Unknown'
+    );
+    CREATE INDEX idx_login_user ON login_logs (user_id);
+    CREATE TABLE file_access_logs (
+        id SERIAL PRIMARY KEY,
+        user_id VARCHAR(50) NOT NULL,
+        file_name VARCHAR(255) NOT NULL,
+        action VARCHAR(10) DEFAULT 'READ',
+        ip_address VARCHAR(45),
+        access_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT INTO login_logs (user_id, login_time, success)
+    SELECT 'u' || g, NOW() - g * INTERVAL '1 hour', g % 2 = 0 FROM generate_series(1, 500) g;
+    INSERT INTO login_logs (user_id, login_time) VALUES ('no-time', NULL);
+    INSERT INTO file_access_logs (user_id, file_name, access_time)
+    SELECT 'u' || g, 'f' || g, NOW() - g * INTERVAL '1 hour' FROM generate_series(1, 500) g;
+"""
+
+@pytest.fixture
+def db(monkeypatch):
+    import database
+    # The pool may already exist if another test imported database first
+    monkeypatch.setattr(database.pool, "dsn", TEST_DATABASE_URL)
+    from database import get_db
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(LEGACY_TABLES_SQL)
+        conn.commit()
+        yield conn, cursor
+        cursor.close()
+
+def test_converts_legacy_tables_and_keeps_rows(db):
+    from migrate_partitions import migrate_partitions
+    conn, cursor = db
+    migrate_partitions()
+    migrate_partitions()  # A second run finds nothing to do
+
+    for table, key, rows in (("login_logs", "login_time", 501), ("file_access_logs", "access_time", 500)):
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", (table,))
+        assert cursor.fetchone()[0] == "p"
+        cursor.execute(f"SELECT COUNT(*) FROM {table}_legacy")
+        assert cursor.fetchone()[0] == rows
+        # The legacy partition's primary key is the parent's (id, key), not the old (id)
+        cursor.execute("""
+            SELECT pg_get_indexdef(indexrelid) FROM pg_index
+            WHERE indrelid = %s::regclass AND indisprimary
+        """, (f"{table}_legacy",))
+        assert cursor.fetchone()[0].endswith(f"(id, {key})")
+        cursor.execute("""
+            SELECT COUNT(*) FROM pg_index i JOIN pg_class c ON c.oid = i.indrelid
+            WHERE c.relname LIKE %s AND NOT i.indisvalid
+        """, (f"{table}%",))
+        assert cursor.fetchone()[0] == 0
+
+    cursor.execute("INSERT INTO login_logs (user_id, success) VALUES ('new', true) RETURNING id")
+    assert cursor.fetchone()[0] > 501
+    conn.rollback()
@@ -0,0 +1,31 @@
+from offline_geo import OfflineGeoDB
+
+HEADER = "start_ip,end_ip,country,city,region,latitude,longitude,timezone,isp,postal"
+
+def _load(tmp_path, rows, header=HEADER, **kwargs):
+    path = tmp_path / "ranges.csv"
+    path.write_text("\n".join([header] + rows) + "\n", encoding="utf-8")
+    return OfflineGeoDB.load(str(path), **kwargs)
+
+def test_integer_family_comes_from_the_row(tmp_path):
+    db = _load(tmp_path, [
+        "0,16777215,V4,,,0,0,,,,4",
+        # ::/104 as integers, small enough to pass for IPv4
+        "0,16777215,V6,,,0,0,,,,6",
+    ], header=HEADER + ",ip_version")
+    assert db.find("0.0.0.1")["country"] == "V4"
+    assert db.find("::1")["country"] == "V6"
+
+def test_integer_family_comes_from_the_file(tmp_path):
+    mapped = 0xFFFF << 32
+    db = _load(tmp_path, [
+        "0,16777215,V6,,,0,0,,,",
+        f"{mapped + 0x08080800},{mapped + 0x080808FF},Mapped,,,0,0,,,",
+    ], integer_version=6)
+    assert db.find("::1")["country"] == "V6"
+    assert db.find("0.0.0.1") is None
+    assert db.find("8.8.8.8")["country"] == "Mapped"
+
+def test_out_of_range_integer_is_skipped(tmp_path):
+    db = _load(tmp_path, [f"{1 << 32},{(1 << 32) + 5},Bad,,,0,0,,,"])
+    assert len(db) == 0
@@ -0,0 +1,24 @@
+import gzip
+
+import pytest
+
+pytest.importorskip("starlette")
+pytest.importorskip("psycopg2")
+pytest.importorskip("asyncpg")
+from telemetry import BodyTooLarge, TelemetryError, gunzip
+
+def test_gunzip_round_trip():
+    assert gunzip(gzip.compress(b'{"user_id": "alice"}')) == b'{"user_id": "alice"}'
+
+def test_gzip_bomb_stops_at_the_inflated_limit():
+    bomb = gzip.compress(b"\0" * (64 * 1024 * 1024))
+    with pytest.raises(BodyTooLarge):
+        gunzip(bomb, max_size=1024 * 1024)
+
+def test_compressed_limit():
+    with pytest.raises(BodyTooLarge):
+        gunzip(gzip.compress(b"x" * 1000), max_compressed=10)
+
+def test_truncated_body():
+    with pytest.raises(TelemetryError):
+        gunzip(gzip.compress(b"x" * 100)[:-5])
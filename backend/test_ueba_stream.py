@@ -0,0 +1,46 @@
+import time
+
+import ueba_stream
+from ueba_stream import StreamingUEBA
+
+# Signals expire against the wall clock, so events are placed relative to it
+NOW = time.time()
+
+def test_out_of_order_events_expire_by_timestamp():
+    engine = StreamingUEBA(window=100)
+    # A late event from t=10 arrives after newer ones
+    for t in (50, 60, 10, 70, 80, 90):
+        engine.observe_file("alice", "notes.txt", "READ", NOW + t)
+    times = list(engine._users["alice"].files.times)
+    assert times == sorted(times)
+
+    # 100s after t=15 everything before it has left the window, including the late event
+    engine.signals("alice", now=NOW + 115)
+    assert list(engine._users["alice"].files.times) == [NOW + t for t in (50, 60, 70, 80, 90)]
+
+def test_late_event_does_not_move_a_signal_back():
+    engine = StreamingUEBA(window=100)
+    engine.observe_file("alice", "notes.txt", "DELETE", NOW + 200)
+    engine.observe_file("alice", "notes.txt", "DELETE", NOW + 120)
+    assert "FILE_DELETION" in engine.signals("alice", now=NOW + 250)
+
+def test_late_ips_counted_once_in_window():
+    engine = StreamingUEBA(window=100)
+    for t, ip in ((100, "10.0.0.1"), (110, "10.0.0.2"), (10, "10.0.0.3"), (120, "10.0.0.4")):
+        engine.observe_login("bob", NOW + t, ip, True, "India")
+    # 10.0.0.3 is older than the window at t=120 and must not count
+    assert len(engine._users["bob"].ips) == 3
+
+def test_event_cap_only_applies_to_windowed_engines(monkeypatch):
+    monkeypatch.setattr(ueba_stream, "UEBA_MAX_EVENTS", 3)
+    windowed = StreamingUEBA(window=1000)
+    unwindowed = StreamingUEBA(window=None, max_users=float("inf"))
+    for t in range(10):
+        windowed.observe_file("carol", "a.txt", "READ", NOW + t)
+        unwindowed.observe_file("carol", "a.txt", "READ", NOW + t)
+    assert list(windowed._users["carol"].files.times) == [NOW + 7, NOW + 8, NOW + 9]
+    assert len(unwindowed._users["carol"].files) == 10
+
+    # A late event older than everything kept by a full window is dropped
+    windowed.observe_file("carol", "a.txt", "READ", NOW - 50)
+    assert list(windowed._users["carol"].files.times) == [NOW + 7, NOW + 8, NOW + 9]
@@ -0,0 +1,75 @@
+"""
+UEBA detection rules, declared as data and compiled once.
+
+UEBA_RULES holds every threshold and list the detectors use. A JSON file
+at UEBA_RULES_PATH can override any of the keys. compile_rules() turns
+the lists into the structures the hot path wants: frozensets for exact
+matches, one precompiled regex for file name patterns, a per-hour lookup
+table for odd hours, and an ip_classifier prefix table for internal
+networks, so adding a rule never touches the per-event code.
+"""
+
+import json
+import os
+import re
+
+from ip_classifier import CORPORATE_NETWORKS, INTERNAL_CATEGORIES, IPClassifier
+
+UEBA_RULES_PATH = os.getenv("UEBA_RULES_PATH", "")
+
+UEBA_RULES = {
+    # Logins before odd_hours_before:00 or after odd_hours_after:59 are odd
+    "odd_hours_before": 6,
+    "odd_hours_after": 22,
+    "max_logins": 5,
+    "max_countries": 2,
+    "max_ips": 3,
+    "max_devices": 2,
+    "max_file_accesses": 20,
+    "unknown_macs": ["UNKNOWN"],
+    "hotspot_ssids": ["iphone", "android", "hotspot"],
+    "sensitive_files": ["credentials.txt", "secrets.env", ".env", "id_rsa", "config.json"],
+    # Regexes searched in the file name, e.g. "\\.pem$"
+    "sensitive_file_patterns": [],
+    # Extra CIDRs treated as internal, on top of ip_classifier's ranges and CORPORATE_NETWORKS
+    "internal_networks": [],
+}
+
+class CompiledRules:
+    def __init__(self, rules):
+        self.rules = rules
+        before, after = rules["odd_hours_before"], rules["odd_hours_after"]
+        self.odd_hours = tuple(hour < before or hour > after for hour in range(24))
+        self.max_logins = rules["max_logins"]
+        self.max_countries = rules["max_countries"]
+        self.max_ips = rules["max_ips"]
+        self.max_devices = rules["max_devices"]
+        self.max_file_accesses = rules["max_file_accesses"]
+        self.unknown_macs = frozenset(rules["unknown_macs"])
+        self.hotspot_ssids = frozenset(ssid.lower() for ssid in rules["hotspot_ssids"])
+        self.sensitive_files = frozenset(rules["sensitive_files"])
+        patterns = rules["sensitive_file_patterns"]
+        self.sensitive_file_pattern = re.compile("|".join(f"(?:{p})" for p in patterns)) if patterns else None
+        self.ip_classifier = IPClassifier(CORPORATE_NETWORKS + list(rules["internal_networks"]))
+        # Plain lookup so the hot path makes no Python-level call on a hit
+        self.ip_categories = self.ip_classifier.categories
+        self.internal_categories = INTERNAL_CATEGORIES
+        if self.sensitive_file_pattern is None:
+            self.is_sensitive_file = self.sensitive_files.__contains__
+
+    def is_sensitive_file(self, file_name):
+        if file_name in self.sensitive_files:
+            return True
+        return bool(file_name and self.sensitive_file_pattern.search(file_name))
+
+def load_rules(path=UEBA_RULES_PATH):
+    rules = dict(UEBA_RULES)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            rules.update(json.load(f))
+    return rules
+
+def compile_rules(rules=None):
+    return CompiledRules(rules if rules is not None else load_rules())
+
+default_rules = compile_rules()
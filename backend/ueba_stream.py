@@ -0,0 +1,294 @@
+"""
+Incremental UEBA engine.
+
+Keeps a small state object per active user and updates it one event at a
+time, instead of rebuilding every signal from the full log history. All
+counters are sliding windows over the last UEBA_WINDOW seconds, kept in
+timestamp order: each in-order event is appended once and expired once,
+so observing an event is O(1) amortized, and a late event is inserted at
+its place from the back. Users with no events inside the window are evicted, and at
+most UEBA_MAX_USERS users are tracked (least recently active go first),
+so memory is bounded by the number of active users.
+
+Signals and thresholds are the same as ueba.analyze_ueba, which replays
+its log lists through an engine without a window. Both take their rules
+from ueba_rules, compiled once per engine.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from ueba_rules import default_rules
+
+UEBA_WINDOW = float(os.getenv("UEBA_WINDOW", "86400"))
+UEBA_MAX_USERS = int(os.getenv("UEBA_MAX_USERS", "100000"))
+# Per-user cap on events kept in a window, counts saturate beyond it.
+# Engines without a window (analyze_ueba) count everything
+UEBA_MAX_EVENTS = int(os.getenv("UEBA_MAX_EVENTS", "10000"))
+
+def _timestamp(value):
+    if value is None:
+        return time.time()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+def _insert(events, item, t, time_of):
+    # Late events are rare and usually only slightly late, so walk back from the end
+    i = len(events)
+    while i and time_of(events[i - 1]) > t:
+        i -= 1
+    events.insert(i, item)
+
+def _time(t):
+    return t
+
+def _event_time(event):
+    return event[0]
+
+class _WindowCounter:
+    """Number of events in the window"""
+    __slots__ = ("times", "cap")
+
+    def __init__(self, cap=None):
+        self.times = deque()
+        self.cap = cap
+
+    def add(self, t):
+        times = self.times
+        if self.cap is not None and len(times) >= self.cap:
+            if t < times[0]:
+                return  # It would be the first one dropped
+            times.popleft()
+        if times and t < times[-1]:
+            _insert(times, t, t, _time)
+        else:
+            times.append(t)
+
+    def expire(self, cutoff):
+        times = self.times
+        while times and times[0] < cutoff:
+            times.popleft()
+
+    def __len__(self):
+        return len(self.times)
+
+class _WindowDistinct:
+    """Number of distinct values seen in the window"""
+    __slots__ = ("events", "counts", "cap")
+
+    def __init__(self, cap=None):
+        self.events = deque()
+        self.counts = {}
+        self.cap = cap
+
+    def add(self, t, value):
+        events = self.events
+        if self.cap is not None and len(events) >= self.cap:
+            if t < events[0][0]:
+                return
+            self._pop()
+        if events and t < events[-1][0]:
+            _insert(events, (t, value), t, _event_time)
+        else:
+            events.append((t, value))
+        self.counts[value] = self.counts.get(value, 0) + 1
+
+    def _pop(self):
+        _, value = self.events.popleft()
+        remaining = self.counts[value] - 1
+        if remaining:
+            self.counts[value] = remaining
+        else:
+            del self.counts[value]
+
+    def expire(self, cutoff):
+        events = self.events
+        while events and events[0][0] < cutoff:
+            self._pop()
+
+    def __len__(self):
+        return len(self.counts)
+
+class _UserState:
+    __slots__ = ("last_seen", "logins", "ips", "countries", "devices", "files", "flags")
+
+    def __init__(self, cap=None):
+        self.last_seen = 0.0
+        self.logins = _WindowCounter(cap)
+        self.ips = _WindowDistinct(cap)
+        self.countries = _WindowDistinct(cap)
+        self.devices = _WindowDistinct(cap)
+        self.files = _WindowCounter(cap)
+        # Event-level signals, signal -> time it last fired
+        self.flags = {}
+
+    def flag(self, signal, t):
+        # A late event must not move the signal back in time
+        if t > self.flags.get(signal, t - 1):
+            self.flags[signal] = t
+
+    def expire(self, cutoff):
+        self.logins.expire(cutoff)
+        self.ips.expire(cutoff)
+        self.countries.expire(cutoff)
+        self.devices.expire(cutoff)
+        self.files.expire(cutoff)
+
+class StreamingUEBA:
+    def __init__(self, window=UEBA_WINDOW, max_users=UEBA_MAX_USERS, rules=default_rules):
+        # window=None never expires anything
+        self.window = window
+        self.max_users = max_users
+        self.rules = rules
+        self._users = OrderedDict()
+        # Events arrive on the event loop while sync handlers read from the threadpool
+        self._lock = threading.RLock()
+        self._clock = 0.0
+        self.events = 0
+        self.evicted = 0
+
+    def _cutoff(self, now=None):
+        if self.window is None:
+            return float("-inf")
+        return (now if now is not None else max(self._clock, time.time())) - self.window
+
+    def _state(self, user, t):
+        self.events += 1
+        if t > self._clock:
+            self._clock = t
+        state = self._users.get(user)
+        if state is None:
+            state = self._users[user] = _UserState(None if self.window is None else UEBA_MAX_EVENTS)
+        else:
+            self._users.move_to_end(user)
+        state.last_seen = max(state.last_seen, t)
+        self._evict()
+        return state
+
+    def _evict(self):
+        users = self._users
+        cutoff = self._cutoff(self._clock)
+        while users:
+            user, state = next(iter(users.items()))
+            if len(users) <= self.max_users and state.last_seen >= cutoff:
+                break
+            del users[user]
+            self.evicted += 1
+
+    def observe_login(self, user, login_time=None, ip_address=None, success=True, country="Unknown"):
+        with self._lock:
+            t = _timestamp(login_time)
+            state = self._state(user, t)
+            rules = self.rules
+            if rules.odd_hours[datetime.fromtimestamp(t).hour]:
+                state.flag("ODD_LOGIN_TIME", t)
+            if not success:
+                state.flag("FAILED_LOGIN", t)
+            if ip_address and rules.ip_categories[ip_address] not in rules.internal_categories:
+                state.flag("EXTERNAL_NETWORK", t)
+            state.logins.add(t)
+            state.ips.add(t, ip_address)
+            state.countries.add(t, country or "Unknown")
+            return self._signals(state)
+
+    def observe_device(self, user, mac_address=None, wifi_ssid=None, trusted=False, seen=None):
+        with self._lock:
+            t = _timestamp(seen)
+            state = self._state(user, t)
+            rules = self.rules
+            if mac_address in rules.unknown_macs:
+                state.flag("UNKNOWN_DEVICE_ID", t)
+            if (wifi_ssid or "").lower() in rules.hotspot_ssids:
+                state.flag("HOTSPOT_NETWORK", t)
+            if not trusted:
+                state.flag("UNTRUSTED_DEVICE", t)
+            state.devices.add(t, mac_address)
+            return self._signals(state)
+
+    def observe_file(self, user, file_name, action=None, access_time=None):
+        with self._lock:
+            t = _timestamp(access_time)
+            state = self._state(user, t)
+            if self.rules.is_sensitive_file(file_name):
+                state.flag("SENSITIVE_FILE_ACCESS", t)
+            if action == "DELETE":
+                state.flag("FILE_DELETION", t)
+            state.files.add(t)
+            return self._signals(state)
+
+    def _signals(self, state, now=None):
+        cutoff = self._cutoff(now)
+        state.expire(cutoff)
+        rules = self.rules
+        signals = [signal for signal, t in state.flags.items() if t >= cutoff]
+        if len(state.logins) > rules.max_logins:
+            signals.append("MULTIPLE_LOGIN_ATTEMPTS")
+        if len(state.countries) > rules.max_countries:
+            signals.append("GEOLOCATION_ANOMALY")
+        if len(state.ips) > rules.max_ips:
+            signals.append("MULTIPLE_IP_ADDRESSES")
+        if len(state.devices) > rules.max_devices:
+            signals.append("DEVICE_CHANGE_DETECTED")
+        if len(state.files) > rules.max_file_accesses:
+            signals.append("EXCESSIVE_FILE_ACCESS")
+        return signals
+
+    def signals(self, user, now=None):
+        """Current signals for one user, [] if the user has no events in the window"""
+        with self._lock:
+            state = self._users.get(user)
+            return self._signals(state, now) if state else []
+
+    def snapshot(self, now=None):
+        """{user: [signals]} for every tracked user with at least one signal, like analyze_ueba"""
+        result = {}
+        with self._lock:
+            for user, state in list(self._users.items()):
+                signals = self._signals(state, now)
+                if signals:
+                    result[user] = signals
+        return result
+
+    def stats(self):
+        with self._lock:
+            active_users = len(self._users)
+        return {
+            "window": self.window,
+            "active_users": active_users,
+            "max_users": self.max_users,
+            "events": self.events,
+            "evicted": self.evicted,
+        }
+
+def load_recent(engine, db):
+    """Replay the last window of logs into `engine`, e.g. after a restart"""
+    window = int(engine.window or 0)
+    cursor = db.cursor()
+    cursor.execute("""
+        SELECT 'login', user_id, login_time, ip_address, success, country FROM login_logs
+        WHERE login_time > NOW() - make_interval(secs => %s)
+        UNION ALL
+        SELECT 'device', user_id, first_seen, mac_address, trusted, wifi_ssid FROM device_logs
+        WHERE first_seen > NOW() - make_interval(secs => %s)
+        UNION ALL
+        SELECT 'file', user_id, access_time, file_name, NULL, action FROM file_access_logs
+        WHERE access_time > NOW() - make_interval(secs => %s)
+        ORDER BY 3
+    """, (window, window, window))
+    count = 0
+    for kind, user, at, value, flag, text in cursor:
+        if kind == "login":
+            engine.observe_login(user, at, value, flag, text)
+        elif kind == "device":
+            engine.observe_device(user, value, text, flag, at)
+        else:
+            engine.observe_file(user, value, text, at)
+        count += 1
+    cursor.close()
+    return count
+
+ueba_engine = StreamingUEBA()